@@ -0,0 +1,129 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Times the brewin programs in this directory against each interpreter version.
+#
+# Every benchmark is a .src file whose first line lists the versions it is written for
+# ("# versions: 2 3"); brewin v1 lacks parameters, locals and types, so v1 benchmarks are separate
+# programs (name_v1.src). The expected output is in the matching .exp file and is checked once per
+# benchmark before it is timed. Each benchmark runs warmup times untimed, then repeat times timed,
+# each run with a fresh interpreter. Results are written as JSON, and, given a saved baseline
+# (a previous results file), any benchmark whose median got slower by more than the threshold is
+# reported as a regression and the runner exits with status 1.
+#
+#   python3 benchmarks/run_benchmarks.py                       # all benchmarks, all versions
+#   python3 benchmarks/run_benchmarks.py -v 3 --engine vm -o new.json --baseline old.json
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))   # the interpreters live in the repo root
+
+VERSIONS_PREFIX = '# versions:'
+
+def find_benchmarks(names=None):
+  benchmarks = []
+  for filename in sorted(os.listdir(BENCHMARK_DIR)):
+    if not filename.endswith('.src'):
+      continue
+    name = filename[:-len('.src')]
+    if names and name not in names:
+      continue
+    srcfile = os.path.join(BENCHMARK_DIR, filename)
+    with open(srcfile) as handle:
+      program = handle.readlines()
+    with open(os.path.join(BENCHMARK_DIR, name + '.exp')) as handle:
+      expected = [line.rstrip('\n') for line in handle.readlines()]
+    versions = program[0][len(VERSIONS_PREFIX):].split() if program[0].startswith(VERSIONS_PREFIX) else []
+    benchmarks.append({'name': name, 'program': program, 'expected': expected, 'versions': versions})
+  return benchmarks
+
+def run_once(interpreter_lib, program, options):
+  interpreter = interpreter_lib.Interpreter(False, None, False, **options)
+  start = time.perf_counter()
+  interpreter.run(program)
+  elapsed = time.perf_counter() - start
+  return elapsed, interpreter.get_output()
+
+def time_benchmark(benchmark, version, warmup, repeat, options):
+  interpreter_lib = importlib.import_module(f'interpreterv{version}')
+  _, output = run_once(interpreter_lib, benchmark['program'], options)
+  if output != benchmark['expected']:
+    raise Exception(f'{benchmark["name"]} produced {output} on v{version}, expected {benchmark["expected"]}')
+  for _ in range(warmup):
+    run_once(interpreter_lib, benchmark['program'], options)
+  times = [run_once(interpreter_lib, benchmark['program'], options)[0] for _ in range(repeat)]
+  return {
+    'benchmark': benchmark['name'],
+    'version': version,
+    'min': min(times),
+    'median': statistics.median(times),
+    'mean': statistics.mean(times),
+    'runs': times,
+  }
+
+# the results whose median is more than threshold (a fraction) slower than the baseline's
+def find_regressions(results, baseline, threshold):
+  baseline_medians = {(result['benchmark'], result['version']): result['median'] for result in baseline['results']}
+  regressions = []
+  for result in results['results']:
+    old = baseline_medians.get((result['benchmark'], result['version']))
+    if old and result['median'] > old * (1 + threshold):
+      regressions.append((result, old))
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-v', '--versions', nargs='+', default=['1', '2', '3'], help='interpreter versions to time')
+  parser.add_argument('-b', '--benchmarks', nargs='+', help='only run these benchmarks')
+  parser.add_argument('--warmup', type=int, default=1, help='untimed runs before timing')
+  parser.add_argument('--repeat', type=int, default=5, help='timed runs')
+  parser.add_argument('--engine', help='engine for the v3 interpreter (line or vm)')
+  parser.add_argument('--memoize', action='store_true', help='memoize pure functions in the v3 interpreter')
+  parser.add_argument('-o', '--output', default='benchmark_results.json', help='where to write the results')
+  parser.add_argument('--baseline', help='results file to compare against')
+  parser.add_argument('--threshold', type=float, default=0.10, help='slowdown (fraction of the baseline) that counts as a regression')
+  args = parser.parse_args()
+
+  results = {
+    'python': platform.python_version(),
+    'warmup': args.warmup,
+    'repeat': args.repeat,
+    'engine': args.engine,
+    'memoize': args.memoize,
+    'results': [],
+  }
+  for benchmark in find_benchmarks(args.benchmarks):
+    for version in args.versions:
+      if version not in benchmark['versions']:
+        continue
+      options = {}
+      if version == '3':
+        if args.engine:
+          options['engine'] = args.engine
+        if args.memoize:
+          options['memoize'] = True
+      result = time_benchmark(benchmark, version, args.warmup, args.repeat, options)
+      results['results'].append(result)
+      print(f'{benchmark["name"]:<20} v{version}  median {result["median"]:.4f}s  min {result["min"]:.4f}s')
+
+  with open(args.output, 'w') as handle:
+    json.dump(results, handle, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as handle:
+      baseline = json.load(handle)
+    regressions = find_regressions(results, baseline, args.threshold)
+    for result, old in regressions:
+      print(f'REGRESSION: {result["benchmark"]} v{result["version"]} median {result["median"]:.4f}s, '
+            f'baseline {old:.4f}s ({100 * (result["median"] / old - 1):+.1f}%)')
+    if regressions:
+      sys.exit(1)
+    print(f'No regressions against {args.baseline}.')
+
+if __name__ == '__main__':
+  main()
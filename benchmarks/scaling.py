@@ -0,0 +1,151 @@
+import argparse
+import importlib
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+# Generates brewin programs that grow along one dimension at a time and measures how the
+# interpreter's runtime and peak memory grow with them, to catch costs that are super-linear in
+# something other than the number of statements executed:
+#   lines        a loop whose body skips over an if block of size statements
+#   nesting      a variable read from inside size nested blocks
+#   functions    size functions, each called once and passed around as a value (v3)
+#   recursion    recursion size calls deep
+#   lambdas      size closures created and called
+#   environment  a closure created over and over with size variables in scope
+# Each program is timed (best of --repeat runs) and run once more under tracemalloc for peak
+# memory. The growth column is the exponent k in time ~ size^k between consecutive sizes: ~1 is
+# linear, and anything well above 1 is flagged.
+#
+#   python3 benchmarks/scaling.py --sizes 100 200 400 800 -d nesting lambdas --json scaling.json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SUPERLINEAR = 1.5   # growth exponent above which a dimension is flagged
+
+def generate_lines(size):
+  program = ['func main void', '  var int i x', '  while < i 50', '    if == i -1']
+  program += ['      assign x + x 1'] * size
+  program += ['    endif', '    assign i + i 1', '  endwhile', '  funccall print i', 'endfunc']
+  return program
+
+def generate_nesting(size):
+  program = ['func main void', '  var int x']
+  for depth in range(size):
+    indent = '  ' * (depth + 1)
+    program += [f'{indent}if True', f'{indent}  var int v{depth}']
+  indent = '  ' * (size + 1)
+  program += [f'{indent}var int i', f'{indent}while < i 200', f'{indent}  assign x + x i',
+              f'{indent}  assign i + i 1', f'{indent}endwhile']
+  for depth in reversed(range(size)):
+    program.append('  ' * (depth + 1) + 'endif')
+  program += ['  funccall print x', 'endfunc']
+  return program
+
+def generate_functions(size, version):
+  program = []
+  for index in range(size):
+    program += [f'func f{index} x:int int', f'  return + x {index}', 'endfunc']
+  program += ['func main void', '  var int total']
+  if version == '3':
+    program.append('  var func g')
+  for index in range(size):
+    if version == '3':
+      program += [f'  assign g f{index}', '  funccall g total']
+    else:
+      program.append(f'  funccall f{index} total')
+    program.append('  assign total resulti')
+  program += ['  funccall print total', 'endfunc']
+  return program
+
+def generate_recursion(size):
+  return ['func down n:int int', '  if == n 0', '    return 0', '  endif', '  var int m', '  assign m - n 1',
+          '  funccall down m', '  return + resulti 1', 'endfunc',
+          'func main void', f'  funccall down {size}', '  funccall print resulti', 'endfunc']
+
+def generate_lambdas(size):
+  program = ['func main void', '  var int total']
+  for index in range(size):
+    program += ['  lambda x:int int', f'    return + x {index}', '  endlambda',
+                '  funccall resultf total', '  assign total resulti']
+  program += ['  funccall print total', 'endfunc']
+  return program
+
+def generate_environment(size):
+  program = ['func main void', '  var int i total']
+  program += [f'  var int v{index}' for index in range(size)]
+  program += ['  while < i 100', '    lambda x:int int', '      return + x v0', '    endlambda',
+              '    funccall resultf i', '    assign total + total resulti', '    assign i + i 1', '  endwhile',
+              '  funccall print total', 'endfunc']
+  return program
+
+GENERATORS = {
+  'lines': lambda size, version: generate_lines(size),
+  'nesting': lambda size, version: generate_nesting(size),
+  'functions': generate_functions,
+  'recursion': lambda size, version: generate_recursion(size),
+  'lambdas': lambda size, version: generate_lambdas(size),
+  'environment': lambda size, version: generate_environment(size),
+}
+V3_ONLY = {'lambdas', 'environment'}
+
+# the best of repeat timed runs, and the peak memory of one more run
+def measure(interpreter_lib, program, options, repeat):
+  elapsed = float('inf')
+  for _ in range(repeat):
+    interpreter = interpreter_lib.Interpreter(False, None, False, **options)
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = min(elapsed, time.perf_counter() - start)
+
+  interpreter = interpreter_lib.Interpreter(False, None, False, **options)
+  tracemalloc.start()
+  try:
+    interpreter.run(program)
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return elapsed, peak
+
+def growth(previous, current):
+  if previous is None or previous['time'] <= 0 or current['time'] <= 0:
+    return None
+  return math.log(current['time'] / previous['time']) / math.log(current['size'] / previous['size'])
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-d', '--dimensions', nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+  parser.add_argument('--sizes', nargs='+', type=int, default=[50, 100, 200, 400])
+  parser.add_argument('-v', '--version', default='3', choices=['2', '3'])
+  parser.add_argument('--repeat', type=int, default=3, help='timed runs per program; the fastest counts')
+  parser.add_argument('--engine', help='engine for the v3 interpreter (line or vm)')
+  parser.add_argument('--json', help='also write the measurements to this file')
+  args = parser.parse_args()
+
+  interpreter_lib = importlib.import_module(f'interpreterv{args.version}')
+  options = {'engine': args.engine} if args.engine and args.version == '3' else {}
+  measurements = []
+  print(f'{"dimension":<12} {"size":>7} {"time (s)":>10} {"us/size":>9} {"peak (KB)":>10} {"growth":>7}')
+  for dimension in args.dimensions:
+    if dimension in V3_ONLY and args.version != '3':
+      continue
+    previous = None
+    for size in sorted(args.sizes):
+      elapsed, peak = measure(interpreter_lib, GENERATORS[dimension](size, args.version), options, args.repeat)
+      current = {'dimension': dimension, 'size': size, 'time': elapsed, 'peak_memory': peak}
+      current['growth'] = growth(previous, current)
+      measurements.append(current)
+      exponent = '' if current['growth'] is None else f'{current["growth"]:.2f}'
+      flag = '  <- super-linear' if current['growth'] is not None and current['growth'] > SUPERLINEAR else ''
+      print(f'{dimension:<12} {size:>7} {elapsed:>10.4f} {1e6 * elapsed / size:>9.2f} {peak / 1024:>10.1f} {exponent:>7}{flag}')
+      previous = current
+
+  if args.json:
+    with open(args.json, 'w') as handle:
+      json.dump(measurements, handle, indent=2)
+
+if __name__ == '__main__':
+  main()
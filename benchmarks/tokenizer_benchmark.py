@@ -0,0 +1,96 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Compares the tokenizer against the original character-by-character one (kept below as the
+# reference): checks that both produce the same token text for every line of the repo's brewin
+# programs, then times both on a large source built by repeating those programs.
+#
+#   python3 benchmarks/tokenizer_benchmark.py --lines 200000
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from intbase import InterpreterBase
+from tokenizer import Tokenizer
+
+# the original tokenizer: strips the comment by walking the line a character at a time, then
+# splits the text around each quoted string
+class ReferenceTokenizer:
+  def tokenize_program(program):
+    return [ReferenceTokenizer._tokenize(line.rstrip()) for line in program]
+
+  def _remove_comment(s):
+    in_quote = False
+    for i in range(0,len(s)):
+      if s[i] == '"':
+        in_quote = not in_quote
+      elif s[i] == InterpreterBase.COMMENT_DEF and not in_quote:
+        return s[:i]
+    return s
+
+  def _tokenize(s):
+    s = ReferenceTokenizer._remove_comment(s)
+    tokens = []
+    search_from = 0
+    while True:
+      try:
+        start_quote = s.index('"', search_from)
+      except ValueError:
+        break
+      end_quote = s.index('"', start_quote+1)   # raises on an unterminated string
+      tokens += s[search_from:start_quote].split()
+      tokens.append(s[start_quote:end_quote+1])
+      search_from = end_quote + 1
+    tokens += s[search_from:].split()
+    return tokens
+
+def load_corpus():
+  lines = []
+  for pattern in ('testsv*/*.src', 'failsv*/*.src', 'benchmarks/*.src'):
+    for filename in sorted(glob.glob(os.path.join(REPO_DIR, pattern))):
+      with open(filename) as handle:
+        lines += handle.readlines()
+  return lines
+
+# checks both tokenizers agree on each line, and returns the lines they can both tokenize
+def check_same_tokens(lines):
+  known_tokens = {}
+  checked = []
+  for line_num, line in enumerate(lines):
+    try:
+      expected = ReferenceTokenizer._tokenize(line.rstrip())
+    except ValueError:
+      continue   # unterminated string, which the reference tokenizer can't handle
+    actual = [str(token) for token in Tokenizer.tokenize_line(line_num, line, known_tokens)]
+    if actual != expected:
+      raise Exception(f'Tokens differ for {line!r}: {actual} != {expected}')
+    checked.append(line)
+  return checked
+
+def best_time(tokenize, program, repeat):
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    tokenize(program)
+    best = min(best, time.perf_counter() - start)
+  return best
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--lines', type=int, default=200000, help='size of the generated source')
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  corpus = check_same_tokens(load_corpus())
+  print(f'Same tokens as the reference tokenizer on {len(corpus)} lines.')
+
+  program = (corpus * (args.lines // len(corpus) + 1))[:args.lines]
+  reference = best_time(ReferenceTokenizer.tokenize_program, program, args.repeat)
+  current = best_time(Tokenizer.tokenize_program, program, args.repeat)
+  print(f'reference: {reference:.3f}s   tokenizer: {current:.3f}s   ({reference / current:.2f}x) on {len(program)} lines')
+
+if __name__ == '__main__':
+  main()
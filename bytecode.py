@@ -0,0 +1,67 @@
+from enum import IntEnum
+from intbase import InterpreterBase
+
+# Opcodes for the compiled form of a brewin program. Every source line compiles to exactly one
+# instruction (blank and comment-only lines become NOPs) so instruction indices are identical
+# to line numbers, and the IP, return stack, jump table and error line numbers all carry over
+# unchanged from the line-by-line engine.
+class Opcode(IntEnum):
+  NOP = 0
+  ASSIGN = 1
+  CALL = 2       # call to a user-defined function, lambda or method
+  PRINT = 3      # funccall print ...
+  INPUT = 4      # funccall input ...
+  STRTOINT = 5   # funccall strtoint ...
+  FUNCCALL = 6   # malformed funccall (no function name); reported when executed
+  ENDFUNC = 7
+  IF = 8
+  ELSE = 9
+  ENDIF = 10
+  RETURN = 11
+  WHILE = 12
+  ENDWHILE = 13
+  VAR = 14
+  LAMBDA = 15
+  ENDLAMBDA = 16
+  UNKNOWN = 17   # unrecognized statement; reported when executed
+
+# Compiles a tokenized program into a list of (opcode, operands) instructions, one per line.
+# The operands are the statement's arguments with the keyword (and, for calls to the builtin
+# functions, the function name) already stripped off, so the VM never looks at them again to
+# decide what to do.
+class Compiler:
+  STATEMENTS = {
+    InterpreterBase.ASSIGN_DEF: Opcode.ASSIGN,
+    InterpreterBase.ENDFUNC_DEF: Opcode.ENDFUNC,
+    InterpreterBase.IF_DEF: Opcode.IF,
+    InterpreterBase.ELSE_DEF: Opcode.ELSE,
+    InterpreterBase.ENDIF_DEF: Opcode.ENDIF,
+    InterpreterBase.RETURN_DEF: Opcode.RETURN,
+    InterpreterBase.WHILE_DEF: Opcode.WHILE,
+    InterpreterBase.ENDWHILE_DEF: Opcode.ENDWHILE,
+    InterpreterBase.VAR_DEF: Opcode.VAR,
+    InterpreterBase.LAMBDA_DEF: Opcode.LAMBDA,
+    InterpreterBase.ENDLAMBDA_DEF: Opcode.ENDLAMBDA,
+  }
+  BUILTINS = {
+    InterpreterBase.PRINT_DEF: Opcode.PRINT,
+    InterpreterBase.INPUT_DEF: Opcode.INPUT,
+    InterpreterBase.STRTOINT_DEF: Opcode.STRTOINT,
+  }
+
+  def compile_program(tokenized_program):
+    return [Compiler._compile_line(tokens) for tokens in tokenized_program]
+
+  def _compile_line(tokens):
+    if not tokens:
+      return (Opcode.NOP, ())
+    args = tokens[1:]
+    if tokens[0] == InterpreterBase.FUNCCALL_DEF:
+      if not args:
+        return (Opcode.FUNCCALL, args)
+      if args[0] in Compiler.BUILTINS:
+        return (Compiler.BUILTINS[args[0]], args[1:])
+      return (Opcode.CALL, args)
+    if tokens[0] in Compiler.STATEMENTS:
+      return (Compiler.STATEMENTS[tokens[0]], args)
+    return (Opcode.UNKNOWN, tokens)
@@ -0,0 +1,73 @@
+import hashlib
+import marshal
+import os
+
+# CompileCache keeps prepared programs (everything the interpreter computes from the source
+# before it starts executing: tokens, indentation, function table, jump targets, type checking and
+# validation results) in a directory on disk, keyed by a hash of the program's source. Entries
+# are plain python data serialized with marshal, which loads much faster than re-running the
+# front end. Loading an entry marks it as recently used; when the directory grows past
+# max_bytes the least recently used entries are deleted.
+class CompileCache:
+  FORMAT_VERSION = 5   # bump whenever the layout of prepared programs changes
+  SUFFIX = '.brewinc'
+
+  def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    os.makedirs(cache_dir, exist_ok=True)
+
+  # returns the prepared program stored for this source, or None if there isn't one
+  def load(self, program):
+    path = self._path(program)
+    try:
+      with open(path, 'rb') as handle:
+        prepared = marshal.loads(handle.read())
+      os.utime(path)   # mark as recently used
+    except (OSError, EOFError, ValueError, TypeError):
+      self.misses += 1
+      return None
+    self.hits += 1
+    return prepared
+
+  def store(self, program, prepared):
+    path = self._path(program)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as handle:
+      handle.write(marshal.dumps(prepared))
+    os.replace(temp_path, path)   # atomic, so concurrent readers never see a partial entry
+    self._evict()
+
+  def _path(self, program):
+    digest = hashlib.sha256(f'{CompileCache.FORMAT_VERSION}\n'.encode())
+    for line in program:
+      # each line's length goes in first, so splitting the same text into lines differently
+      # (lines needn't end in newlines) gives a different key
+      data = line.encode()
+      digest.update(f'{len(data)}:'.encode())
+      digest.update(data)
+    return os.path.join(self.cache_dir, digest.hexdigest() + CompileCache.SUFFIX)
+
+  # delete least recently used entries until the cache fits in max_bytes
+  def _evict(self):
+    entries = []
+    for name in os.listdir(self.cache_dir):
+      if not name.endswith(CompileCache.SUFFIX):
+        continue
+      path = os.path.join(self.cache_dir, name)
+      try:
+        stat = os.stat(path)
+      except OSError:
+        continue   # removed by another process
+      entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      total -= size
@@ -1,5 +1,4 @@
 from enum import Enum
-import copy
 class SymbolResult(Enum):
   OK = 0     # symbol created, didn't exist in top scope
   ERROR = 1  # symbol already exists in top scope
@@ -7,41 +6,40 @@ class SymbolResult(Enum):
 # An improved version of the EnvironmentManager that can manage a separate environment for
 # each function as it executes, and has handling for nested blocks within functions
 # (so variables can go out of scope once a block enters/exits).
-# The internal data structure is essentially a stack (via a python list) of environments
-# where each environment on the stack is a list of one or more dictionaries that map a
-# variable name to a type/value. We need more than one dictionary to accomodate nested
-# blocks in functions.
-# If f() calls g() calls h() then while we're in function h, our stack would have
-# three items on it: [[{dictionary for f}],[{dictionary for g}][{dictionary for h}]]
+# The internal data structure is a stack (via a python list) of Frames, one per active function
+# call. If f() calls g() calls h() then while we're in function h, our stack would have
+# three items on it: [Frame for f, Frame for g, Frame for h]
 class EnvironmentManager:
   def __init__(self):
-    self.environment = [[{}]]
+    self.environment = [Frame()]
+    self.size = 0   # number of variable bindings across all active functions and blocks
 
   def get(self, symbol):
-    nested_envs = self.environment[-1]
-    for env in reversed(nested_envs):
-      if symbol in env:
-        return env[symbol]
+    bindings = self.environment[-1].bindings.get(symbol)
+    if bindings:
+      return bindings[-1]
 
     return None
+
+  # merge captured variables into the blocks of the current function; the last capture
+  # goes into the outermost block
   def set_new_env_var(self, captures):
+    frame = self.environment[-1]
     for ind, elem in enumerate(reversed(captures)):
-      if len(self.environment[-1]) > ind:
-        self.environment[-1][ind] = {**self.environment[-1][ind], **elem}
+      if len(frame.blocks) > ind:
+        self.size += frame.import_mappings(ind, elem)
 
+  # returns a dictionary of the variables defined in the most nested block
   def get_available_vars(self):
-    nested_envs = self.environment[-1]
-    #print(self.environment)
-    return nested_envs[-1]
-
+    frame = self.environment[-1]
+    return {symbol: frame.bindings[symbol][-1] for symbol in frame.blocks[-1]}
 
-    return None
   # create a new symbol in the most nested block's environment; error if
   # the symbol already exists
   def create_new_symbol(self, symbol, create_in_top_block = False):
     block_index = 0 if create_in_top_block else -1
-    if symbol not in self.environment[-1][block_index]:
-      self.environment[-1][block_index][symbol] = None
+    if self.environment[-1].create(block_index, symbol):
+      self.size += 1
       return SymbolResult.OK
 
     return SymbolResult.ERROR
@@ -49,12 +47,10 @@ class EnvironmentManager:
   # set works with symbols that were already created
   # it won't create a new symbol, only update it
   def set(self, symbol, value):
-    nested_envs = self.environment[-1]
-
-    for env in reversed(nested_envs):
-      if symbol in env:
-        env[symbol] = value
-        return SymbolResult.OK
+    bindings = self.environment[-1].bindings.get(symbol)
+    if bindings:
+      bindings[-1] = value
+      return SymbolResult.OK
 
     return SymbolResult.ERROR
 
@@ -62,19 +58,63 @@ class EnvironmentManager:
   # and populate captured variables; use first for captured, then params
   # so params shadow captured variables
   def import_mappings(self, dict):
-    cur_env = self.environment[-1][-1]
-    for symbol, value in dict.items():
-      cur_env[symbol] = value
-
+    self.size += self.environment[-1].import_mappings(-1, dict)
 
   def block_nest(self):
-    self.environment[-1].append({})   # [..., [{}]] -> [..., [{}, {}]]
+    self.environment[-1].blocks.append({})
 
   def block_unnest(self):
-    self.environment[-1].pop()
+    frame = self.environment[-1]
+    block = frame.blocks.pop()
+    self.size -= len(block)
+    for symbol in block:
+      bindings = frame.bindings[symbol]
+      bindings.pop()
+      if not bindings:
+        del frame.bindings[symbol]
 
   def push(self):
-    self.environment.append([{}])       # [[...],[...]] -> [[...],[...],[]]
+    self.environment.append(Frame())
 
   def pop(self):
-    self.environment.pop()
+    frame = self.environment.pop()
+    self.size -= sum(len(block) for block in frame.blocks)
+
+# The variables of one function call. Rather than one dictionary per nested block, which makes
+# every lookup walk the blocks from the innermost out, a frame keeps a flat list of bindings per
+# variable name, one entry per block that defines the name, innermost last. Reading or writing
+# a variable is then a single dictionary lookup and an index, however deeply nested the block.
+# blocks records which names each block defined (in order) so they can be dropped when the
+# block exits.
+class Frame:
+  def __init__(self):
+    self.bindings = {}   # variable name -> [value in outermost defining block, ..., innermost]
+    self.blocks = [{}]   # for each nested block, the names it defines (dict used as ordered set)
+
+  # define symbol in the given block; returns False if that block already defines it
+  def create(self, block_index, symbol):
+    block = self.blocks[block_index]
+    if symbol in block:
+      return False
+    self.bindings.setdefault(symbol, []).insert(self._binding_index(block_index, symbol), None)
+    block[symbol] = None
+    return True
+
+  # define (or overwrite) each symbol in the given block; returns the number of new symbols
+  def import_mappings(self, block_index, mappings):
+    created = 0
+    for symbol, value in mappings.items():
+      created += self.create(block_index, symbol)
+      self.bindings[symbol][self._binding_index(block_index, symbol)] = value
+    return created
+
+  # position of the given block's binding in the name's list of bindings: the number of
+  # enclosing blocks that define the name
+  def _binding_index(self, block_index, symbol):
+    block_index %= len(self.blocks)
+    if block_index == 0:
+      return 0
+    if block_index == len(self.blocks) - 1:
+      defined_here = symbol in self.blocks[-1]
+      return len(self.bindings.get(symbol, ())) - defined_here
+    return sum(1 for block in self.blocks[:block_index] if symbol in block)
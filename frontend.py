@@ -0,0 +1,97 @@
+from func_v2 import FunctionManager
+from intbase import InterpreterBase, ErrorType
+from jump_table import JumpTable
+from tokenizer import Tokenizer, TokenizerError
+
+# FrontEnd reads a brewin program once, line by line, and produces everything the interpreter
+# needs before it can run it: each line's indentation and tokens, the jump table matching block
+# statements, the function and lambda table, and the result of validating the program's blocks
+# and indentation. Validation gives the same answer as InterpreterBase.validate_program, which
+# checks every block before it looks at indentation, so a block error anywhere in the program
+# wins over an indentation error on an earlier line.
+class FrontEnd:
+  BLOCK_STARTS = {
+    InterpreterBase.FUNC_DEF: InterpreterBase.ENDFUNC_DEF,
+    InterpreterBase.IF_DEF: InterpreterBase.ENDIF_DEF,
+    InterpreterBase.WHILE_DEF: InterpreterBase.ENDWHILE_DEF,
+  }
+  BLOCK_ENDS = {InterpreterBase.ENDFUNC_DEF, InterpreterBase.ENDIF_DEF, InterpreterBase.ELSE_DEF,
+                InterpreterBase.ENDWHILE_DEF}
+
+  def __init__(self, program):
+    self.indents = []
+    self.tokens = []
+    self.jump_table = JumpTable([], [])
+    self.func_manager = FunctionManager([])
+    self._blocks = []              # (line number, expected terminator, indent) of each open block
+    self._block_error = None
+    self._indent_stack = []
+    self._bad_indentation_line = None
+    # (error type name, line number, description) of the first line that couldn't be tokenized;
+    # that line gets no tokens, and the interpreter reports the error when the program runs
+    self.tokenizer_error = None
+    known_tokens = {}
+
+    for line_num, line in enumerate(program):
+      indent = len(line) - len(line.lstrip(' '))
+      try:
+        tokens = Tokenizer.tokenize_line(line_num, line, known_tokens)
+      except TokenizerError as e:
+        tokens = []
+        if self.tokenizer_error is None:
+          self.tokenizer_error = (ErrorType.SYNTAX_ERROR.name, e.line_num, e.description)
+      self.indents.append(indent)
+      self.tokens.append(tokens)
+      self.jump_table.add_line(tokens, indent)
+      self.func_manager.add_line(line_num, tokens)
+      if tokens:
+        if self._block_error is None:
+          self._validate_block(line_num, tokens[0], indent)
+        if self._bad_indentation_line is None:
+          self._validate_indentation(line_num, tokens[0], indent)
+    self.func_manager.finish()
+
+    # (error type name, line number, description) of the first validation error, or None
+    self.validation_error = self._block_error
+    if self.validation_error is None and self._bad_indentation_line is not None \
+       and self._bad_indentation_line < len(program) - 1:
+      line_num = self._bad_indentation_line
+      self.validation_error = (ErrorType.SYNTAX_ERROR.name, line_num, f'Bad indentation on line {line_num}')
+
+  def _validate_block(self, line_num, keyword, indent):
+    if keyword in FrontEnd.BLOCK_STARTS:
+      self._blocks.append((line_num, FrontEnd.BLOCK_STARTS[keyword], indent))
+      return
+    if keyword not in FrontEnd.BLOCK_ENDS:
+      return
+    if not self._blocks:
+      self._block_error = (ErrorType.SYNTAX_ERROR.name, line_num, f'Mismatched {keyword} on line {line_num}')
+      return
+    start_line, terminator, start_indent = self._blocks.pop()
+    if keyword == InterpreterBase.ELSE_DEF:
+      if terminator == InterpreterBase.ENDIF_DEF and start_indent == indent:
+        self._blocks.append((start_line, terminator, start_indent))   # still needs its endif
+      else:
+        self._block_error = (ErrorType.SYNTAX_ERROR.name, line_num, 'Mismatched else')
+      return
+    if terminator != keyword or start_indent != indent:
+      self._block_error = (ErrorType.SYNTAX_ERROR.name, start_line, f'Missing {terminator} for block on line {start_line}')
+
+  # statements must be indented further than the block they are in, and a block's terminator
+  # (or else) lined up with its start; the first line that isn't marks bad indentation
+  def _validate_indentation(self, line_num, keyword, indent):
+    stack = self._indent_stack
+    if keyword in FrontEnd.BLOCK_STARTS:
+      if stack and indent <= stack[-1]:
+        self._bad_indentation_line = line_num
+        return
+      stack.append(indent)
+    elif not stack:
+      self._bad_indentation_line = line_num   # a statement outside of any function
+    elif keyword in FrontEnd.BLOCK_ENDS:
+      if indent != stack[-1]:
+        self._bad_indentation_line = line_num
+      elif keyword != InterpreterBase.ELSE_DEF:
+        stack.pop()
+    elif indent <= stack[-1]:
+      self._bad_indentation_line = line_num
@@ -1,4 +1,5 @@
 from intbase import InterpreterBase
+from tokenizer import Tokenizer, TokenKind
 from enum import Enum
 
 class Type(Enum):
@@ -13,15 +14,58 @@ class FuncInfo:
     self.params = params  # format is [[varname1,typename1],[varname2,typename2],...]
     self.start_ip = start_ip    # line number, zero-based
     self.return_type = return_type
+    self.free_vars = ()   # lambdas only: names used in the body that come from the enclosing scope
+    self.captures = None  # closures only: {varname: value} snapshot taken when the lambda ran
   def type(self):
     return "func"
 
 class FunctionManager:
+  BUILTINS = {InterpreterBase.PRINT_DEF, InterpreterBase.INPUT_DEF, InterpreterBase.STRTOINT_DEF}
+
   def __init__(self, tokenized_program):
     self.func_cache = {}
     self.return_types = []  # of each line in the program
     self.return_lambda_types = []
-    self._cache_function_parameters_and_return_type(tokenized_program)
+    self.return_type_stack = [None]  # v3
+    self.return_lambda_type_stack = [None]
+    self.open_lambdas = []   # entries are [FuncInfo, referenced names, defined names, block depth]
+    for line_num, line in enumerate(tokenized_program):
+      self.add_line(line_num, line)
+    self.finish()
+
+  # scan the next line of the program; lines are added in order, so the function table can be
+  # built in the same pass as other front end work (see FrontEnd). finish() must be called
+  # once the last line has been added.
+  def add_line(self, line_num, line):
+    self._cache_function_parameters_and_return_type(line_num, line)
+    self._cache_lambda_free_variables(line_num, line)
+
+  def finish(self):
+    self.program_functions = dict(self.func_cache)   # the functions as defined, see reset()
+
+  # forget every function binding made while the program ran (func variables, params, methods,
+  # resultf), going back to just the program's own functions and lambdas
+  def reset(self):
+    self.func_cache = dict(self.program_functions)
+
+  # the function table as plain python data (e.g., for caching); FunctionManager.restore()
+  # rebuilds an equivalent FunctionManager from it
+  def export(self):
+    functions = [(name, info.params, info.start_ip, info.return_type, info.free_vars)
+                 for name, info in self.func_cache.items()]
+    return (functions, self.return_types, self.return_lambda_types)
+
+  def restore(exported):
+    functions, return_types, return_lambda_types = exported
+    func_manager = FunctionManager([])
+    for name, params, start_ip, return_type, free_vars in functions:
+      func_info = FuncInfo([tuple(param) for param in params], start_ip, return_type)
+      func_info.free_vars = tuple(free_vars)
+      func_manager.func_cache[name] = func_info
+    func_manager.program_functions = dict(func_manager.func_cache)
+    func_manager.return_types = list(return_types)
+    func_manager.return_lambda_types = list(return_lambda_types)
+    return func_manager
 
   # Returns a FuncInfo for the named function or lambda
   # which contains a list of params/types and the start IP of the
@@ -61,49 +105,74 @@ class FunctionManager:
     var_type = formal.split(':')
     return (var_type[0], var_type[1])
 
-  def _cache_function_parameters_and_return_type(self, tokenized_program):
-    cur_return_type = None
-    reset_after_this_line = False
-    reset_lambda_after_this_line = False
-    return_type_stack = [None]  # v3
-    return_lambda_type_stack = [None]
+  def _cache_function_parameters_and_return_type(self, line_num, line):
+    if line and line[0] == InterpreterBase.FUNC_DEF:
+      func_return = line[-1]
+      # format:  func funcname self.p1:t1 p2:t2 p3:t3 ...
+      func_name = line[1]
+      params = [self._to_tuple(formal) for formal in line[2:-1]]
+      func_info = FuncInfo(params, line_num + 1,func_return)  # function starts executing on line after funcdef
+      self.func_cache[func_name] = func_info
+      self.return_type_stack.append(line[-1])
 
-    for line_num, line in enumerate(tokenized_program):
-      if line and line[0] == InterpreterBase.FUNC_DEF:
-        func_return = line[-1]
-        # format:  func funcname self.p1:t1 p2:t2 p3:t3 ...
-        func_name = line[1]
-        params = [self._to_tuple(formal) for formal in line[2:-1]]
-        func_info = FuncInfo(params, line_num + 1,func_return)  # function starts executing on line after funcdef
-        self.func_cache[func_name] = func_info
-        return_type_stack.append(line[-1])
-        
-
-      if line and line[0] == InterpreterBase.LAMBDA_DEF:
-        func_return = line[-1]
-        func_name = self.create_lambda_name(line_num)
-        params = [self._to_tuple(formal) for formal in line[1:-1]]
-        func_info = FuncInfo(params, line_num + 1, func_return)  # function starts executing on line after funcdef
-        self.func_cache[func_name] = func_info
-        return_lambda_type_stack.append(line[-1])
-        
-      if line and line[0] == InterpreterBase.ENDFUNC_DEF: 
-        reset_after_this_line = True
-      if line and line[0] == InterpreterBase.ENDLAMBDA_DEF:
-        reset_lambda_after_this_line = True
-
-        # each line in the program is assigned a return type based on
-      self.return_types.append(return_type_stack[-1])
-      self.return_lambda_types.append(return_lambda_type_stack[-1])
-      #print(line_num, self.return_lambda_types)
-      
-      #print(len(self.return_types) - 1, self.return_lambda_types)
-                                                  # the function it's associated with; use this to look up valid type
-                                                  # for each return
-      if reset_after_this_line:                  # for each line with a funcend, make sure we know the return type
-        return_type_stack.pop()
-        reset_after_this_line = False
-      if reset_lambda_after_this_line:                  # for each line with a funcend, make sure we know the return type
-        return_lambda_type_stack.pop()
-        reset_lambda_after_this_line = False
+    if line and line[0] == InterpreterBase.LAMBDA_DEF:
+      func_return = line[-1]
+      func_name = self.create_lambda_name(line_num)
+      params = [self._to_tuple(formal) for formal in line[1:-1]]
+      func_info = FuncInfo(params, line_num + 1, func_return)  # function starts executing on line after funcdef
+      self.func_cache[func_name] = func_info
+      self.return_lambda_type_stack.append(line[-1])
+
+    # each line in the program is assigned a return type based on the function it's associated
+    # with; use this to look up valid type for each return
+    self.return_types.append(self.return_type_stack[-1])
+    self.return_lambda_types.append(self.return_lambda_type_stack[-1])
+
+    # for each line with a funcend, make sure we know the return type (a stray funcend is left
+    # for validation to report)
+    if line and line[0] == InterpreterBase.ENDFUNC_DEF and len(self.return_type_stack) > 1:
+      self.return_type_stack.pop()
+    if line and line[0] == InterpreterBase.ENDLAMBDA_DEF and len(self.return_lambda_type_stack) > 1:
+      self.return_lambda_type_stack.pop()
+
+  # find the free variables of every lambda: the names its body (including any nested lambdas)
+  # refers to, minus its own parameters and the variables it defines in its top-level block.
+  # Only these need to be captured when the lambda runs.
+  def _cache_lambda_free_variables(self, line_num, line):
+    open_lambdas = self.open_lambdas
+    if not line or (not open_lambdas and line[0] != InterpreterBase.LAMBDA_DEF):
+      return
+    if line[0] == InterpreterBase.LAMBDA_DEF:
+      if open_lambdas:
+        open_lambdas[-1][3] += 1
+      func_info = self.func_cache[self.create_lambda_name(line_num)]
+      open_lambdas.append([func_info, set(), set(), 0])
+      return
 
+    func_info, referenced, defined, depth = open_lambdas[-1]
+    if line[0] == InterpreterBase.ENDLAMBDA_DEF and depth == 0:
+      open_lambdas.pop()
+      params = {param for param, _ in func_info.params}
+      func_info.free_vars = tuple(sorted(referenced - params - defined))
+      if open_lambdas:
+        open_lambdas[-1][1].update(func_info.free_vars)
+        open_lambdas[-1][3] -= 1
+    elif line[0] in (InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF):
+      open_lambdas[-1][3] += 1
+    elif line[0] in (InterpreterBase.ENDIF_DEF, InterpreterBase.ENDWHILE_DEF):
+      open_lambdas[-1][3] -= 1
+
+    if line[0] == InterpreterBase.VAR_DEF:
+      if depth == 0:
+        defined.update(line[2:])
+      return
+    referenced.update(name for name in map(self._referenced_name, line[1:]) if name)
+
+  # the variable a token refers to, if any: x -> x, obj.member -> obj, literals/operators -> None
+  def _referenced_name(self, token):
+    kind = Tokenizer.kind_of(token)
+    if kind == TokenKind.MEMBER:
+      return token.object_name
+    if kind != TokenKind.IDENTIFIER or token in FunctionManager.BUILTINS:
+      return None
+    return token
@@ -2,7 +2,12 @@ from os import makedirs
 from os.path import exists
 import json
 from abc import ABC, abstractmethod
+import contextlib
+import io
+import multiprocessing
+import multiprocessing.connection
 import threading
+import time
 import _thread as thread
 
 # Test harness; this file is platform agnostic
@@ -53,17 +58,75 @@ def run_test_wrapper(interpreter, test_case):
     print(f'Exception: {e}')
     return 0
 
-def run_all_tests(interpreter, tests):
+def run_all_tests(interpreter, tests, jobs=1):
   print(f'Running {len(tests)} tests...')
-  results = list(map(lambda test: {
+  if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+    scores = run_tests_in_parallel(interpreter, tests, jobs)
+  else:
+    scores = map(lambda test: run_test_wrapper(interpreter, test), tests)
+  results = list(map(lambda test, score: {
     'name': test['name'],
-    'score': run_test_wrapper(interpreter, test),
+    'score': score,
     'max_score': 1,
     'visibility': 'visible' if test.get('visible', False) else 'after_published',
-  }, tests))
+  }, tests, scores))
   print(f'{get_score(results)}/{len(tests)} tests passed.')
   return results
 
+# hard limit on how long one test (validation and run) may take in a worker process before the
+# worker is killed; exit_after still enforces the per-step timeouts inside the worker
+WORKER_TIMEOUT = 15
+
+# runs each test in its own forked worker process, at most jobs at a time, and returns the scores
+# in test order. Each worker's printed output is captured and printed in test order too, so the
+# log reads the same as a serial run
+def run_tests_in_parallel(scaffold, tests, jobs):
+  context = multiprocessing.get_context('fork')
+  scores = [None] * len(tests)
+  outputs = [None] * len(tests)
+  pending = list(range(len(tests)))
+  running = {}   # connection -> (test index, worker process, start time)
+  next_to_print = 0
+
+  while pending or running:
+    while pending and len(running) < jobs:
+      index = pending.pop(0)
+      receiver, sender = context.Pipe(duplex=False)
+      worker = context.Process(target=_run_test_in_worker, args=(scaffold, tests[index], sender))
+      worker.start()
+      sender.close()
+      running[receiver] = (index, worker, time.monotonic())
+
+    for connection in multiprocessing.connection.wait(list(running), timeout=0.1):
+      index, worker, _ = running.pop(connection)
+      try:
+        scores[index], outputs[index] = connection.recv()
+      except EOFError:   # the worker died without reporting
+        scores[index], outputs[index] = 0, f'Running {tests[index]["srcfile"]}... worker crashed FAILED\n'
+      connection.close()
+      worker.join()
+
+    for connection, (index, worker, started) in list(running.items()):
+      if time.monotonic() - started > WORKER_TIMEOUT:
+        worker.kill()
+        worker.join()
+        connection.close()
+        del running[connection]
+        scores[index], outputs[index] = 0, f'Running {tests[index]["srcfile"]}... took too long FAILED\n'
+
+    while next_to_print < len(tests) and outputs[next_to_print] is not None:
+      print(outputs[next_to_print], end = '')
+      next_to_print += 1
+
+  return scores
+
+def _run_test_in_worker(scaffold, test_case, connection):
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+    score = run_test_wrapper(scaffold, test_case)
+  connection.send((score, output.getvalue()))
+  connection.close()
+
 def format_gradescope_output(results):
   if type(results) == int or type(results) == float:
     return {
@@ -1,10 +1,13 @@
 # Base class for our interpreter
+import mmap
 from enum import Enum
+from output_sink import ListSink
 
 class ErrorType(Enum):
   TYPE_ERROR = 1
   NAME_ERROR = 2    # if a variable or function name can't be found
   SYNTAX_ERROR = 3  # used for syntax errors
+  LIMIT_ERROR = 4   # an execution limit (instructions, call depth, environment size) was exhausted
   # Add others here
 
 
@@ -45,15 +48,18 @@ class InterpreterBase:
   ENDLAMBDA_DEF = 'endlambda'
 
   # methods
-  def __init__(self, console_output=True, input=None):
+  def __init__(self, console_output=True, input=None, output=None):
     self.console_output = console_output
-    self.input = input  # if not none, then read input from passed-in list
+    # if not none, then read input from it: a list of lines, or any iterable of lines (e.g., a
+    # generator or an open file) or memory-mapped file, which is read lazily one line at a time
+    self.input = input
+    self.output_sink = output if output is not None else ListSink()  # receives every printed line
     self.reset()
 
   # Call to reset I/O for another run of the program
   def reset(self):
-    self.output_log = []
-    self.input_cursor = 0
+    self.output_sink.reset()
+    self.input_lines = None if not self._has_input() else self._read_lines(self.input)
     self.error_type = None
     self.error_line = None
 
@@ -62,15 +68,28 @@ class InterpreterBase:
     pass
 
   def get_input(self):
-    if not self.input:
+    if self.input_lines is None:
       return input()  # Get input from keyboard if not input list provided
 
-    if self.input_cursor < len(self.input):
-      cur_input = self.input[self.input_cursor]
-      self.input_cursor += 1
-      return cur_input
-    else:
-      return None
+    return next(self.input_lines, None)
+
+  # an empty input list means keyboard input, like no input at all; streams can't be checked
+  # for emptiness without reading them, so they always count as input
+  def _has_input(self):
+    if isinstance(self.input, (list, tuple)):
+      return len(self.input) > 0
+    return self.input is not None
+
+  # yields the input's lines one at a time; lines read from streams lose their trailing newlines
+  def _read_lines(self, source):
+    if isinstance(source, (list, tuple)):
+      yield from source
+      return
+    lines = iter(source.readline, b'') if isinstance(source, mmap.mmap) else source
+    for line in lines:
+      if isinstance(line, bytes):
+        line = line.decode()
+      yield line[:-1] if line.endswith('\n') else line
 
   # students must call this for any errors that they run into
   def error(self, error_type, description=None, line_num=None):
@@ -90,10 +109,11 @@ class InterpreterBase:
   def output(self, v):
     if self.console_output:
       print(v)
-    self.output_log.append(v)
+    self.output_sink.write(v)
 
+  # the printed lines, if the output sink keeps them (the default one does)
   def get_output(self):
-    return self.output_log
+    return self.output_sink.get_output()
 
   def get_error_type_and_line(self):
     return self.error_type, self.error_line
@@ -1,7 +1,8 @@
 from enum import Enum
 from intbase import InterpreterBase, ErrorType
 from env_v1 import EnvironmentManager
-from tokenize import Tokenizer
+from tokenizer import Tokenizer, TokenizerError
+from jump_table import JumpTable
 from func_v1 import FunctionManager
 
 # Enumerated type for our different language data types
@@ -28,8 +29,8 @@ class Value:
 
 # Main interpreter class
 class Interpreter(InterpreterBase):
-  def __init__(self, console_output=True, input=None, trace_output=False):
-    super().__init__(console_output, input)
+  def __init__(self, console_output=True, input=None, trace_output=False, output=None):
+    super().__init__(console_output, input, output)
     self._setup_operations()  # setup all valid binary operations and the types they work on
     self.trace_output = trace_output
 
@@ -37,7 +38,11 @@ class Interpreter(InterpreterBase):
   def run(self, program):
     self.program = program
     self._compute_indentation(program)  # determine indentation of every line
-    self.tokenized_program = Tokenizer.tokenize_program(program)
+    try:
+      self.tokenized_program = Tokenizer.tokenize_program(program)
+    except TokenizerError as e:
+      super().error(ErrorType.SYNTAX_ERROR, e.description, e.line_num)
+    self.jump_table = JumpTable(self.tokenized_program, self.indents)  # matching block statements
     self.func_manager = FunctionManager(self.tokenized_program)
     self.ip = self._find_first_instruction(InterpreterBase.MAIN_FUNC)
     self.return_stack = []
@@ -45,8 +50,11 @@ class Interpreter(InterpreterBase):
     self.env_manager = EnvironmentManager() # used to track variables/scope
 
     # main interpreter run loop
-    while not self.terminate:
-      self._process_line()
+    try:
+      while not self.terminate:
+        self._process_line()
+    finally:
+      self.output_sink.flush()
 
   def _process_line(self):
     if self.trace_output:
@@ -123,26 +131,20 @@ class Interpreter(InterpreterBase):
       self._advance_to_next_statement()
       return
     else:
-      for line_num in range(self.ip+1, len(self.tokenized_program)):
-        tokens = self.tokenized_program[line_num]
-        if not tokens:
-          continue
-        if (tokens[0] == InterpreterBase.ENDIF_DEF or tokens[0] == InterpreterBase.ELSE_DEF) and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          return
+      line_num = self.jump_table.get_partner(self.ip)   # matching else, or endif if there's no else
+      if line_num is not None:
+        self.ip = line_num + 1
+        return
     super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip) #no
 
   def _endif(self):
     self._advance_to_next_statement()
 
   def _else(self):
-    for line_num in range(self.ip+1, len(self.tokenized_program)):
-      tokens = self.tokenized_program[line_num]
-      if not tokens:
-        continue
-      if tokens[0] == InterpreterBase.ENDIF_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          return
+    line_num = self.jump_table.get_partner(self.ip)
+    if line_num is not None:
+      self.ip = line_num + 1
+      return
     super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip) #no
 
   def _return(self,args):
@@ -167,28 +169,18 @@ class Interpreter(InterpreterBase):
     self._advance_to_next_statement()
 
   def _exit_while(self):
-    while_indent = self.indents[self.ip]
-    cur_line = self.ip + 1
-    while cur_line < len(self.tokenized_program):
-      if self.tokenized_program[cur_line][0] == InterpreterBase.ENDWHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line + 1
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line += 1
+    cur_line = self.jump_table.get_partner(self.ip)
+    if cur_line is not None:
+      self.ip = cur_line + 1
+      return
     # didn't find endwhile
     super().error(ErrorType.SYNTAX_ERROR,"Missing endwhile", self.ip) #no
 
   def _endwhile(self, args):
-    while_indent = self.indents[self.ip]
-    cur_line = self.ip - 1
-    while cur_line >= 0:
-      if self.tokenized_program[cur_line][0] == InterpreterBase.WHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line -= 1
+    cur_line = self.jump_table.get_partner(self.ip)
+    if cur_line is not None:
+      self.ip = cur_line
+      return
     # didn't find while
     super().error(ErrorType.SYNTAX_ERROR,"Missing while", self.ip) #no
 
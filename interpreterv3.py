@@ -1,39 +1,124 @@
 import copy
+import operator
+import time
 
 from enum import Enum
 from env_v2 import EnvironmentManager, SymbolResult
 from func_v2 import FunctionManager, FuncInfo
 from intbase import InterpreterBase, ErrorType
-from tokenizer import Tokenizer
+from frontend import FrontEnd
+from tokenizer import Tokenizer, TokenKind
+from jump_table import JumpTable
+from bytecode import Compiler, Opcode
+from type_checker import TypeChecker
+from compile_cache import CompileCache
+from memoizer import Memoizer
+from profiler import Profiler, SamplingProfiler
 
+# The layout of an object (a "hidden class"): which slot holds each member. Objects that were
+# given the same members in the same order share one Shape, since adding a member to an object
+# moves it along a transition from its current shape that is created once and then reused
+class Shape:
+  __slots__ = ('slots', 'transitions')
+
+  def __init__(self, slots):
+    self.slots = slots   # member name -> index in the object's slot array
+    self.transitions = {}   # member name -> shape of an object of this shape with the member added
+
+  def with_member(self, name):
+    shape = self.transitions.get(name)
+    if shape is None:
+      shape = self.transitions[name] = Shape({**self.slots, name: len(self.slots)})
+    return shape
+
+# An object's members are kept in a slot array laid out by the object's Shape
 class Object():
-  def __init__(self) -> None:
-    self.objects = dict()
+  __slots__ = ('shape', 'slots', 'shared', 'cells')
+
+  # shape is the empty root shape of the program's shape tree
+  def __init__(self, shape) -> None:
+    self.shape = shape
+    self.slots = []   # member values, in the order of shape.slots
+    self.shared = False   # slots is shared with a copy of the object, so must be copied before a change
+    # once a MemberCell is bound to one of the members: the Cell that the reference parameters
+    # bound to each member share (or None), in the order of shape.slots
+    self.cells = None
+  # a copy of the object, which shares the object's slot array until either one changes a member
+  def copy(self):
+    new_obj = Object(self.shape)
+    new_obj.slots = self.slots
+    new_obj.shared = self.shared = True
+    return new_obj
   def set(self, method, val):
-    self.objects[method] = val
-  def get(self,method):
-    if method in self.objects:
-      return self.objects
+    if self.shared:
+      self.slots = list(self.slots)
+      self.shared = False
+    index = self.shape.slots.get(method)
+    if index is None:
+      self.shape = self.shape.with_member(method)
+      self.slots.append(val)
+      if self.cells is not None:
+        self.cells.append(None)
     else:
+      self.slots[index] = val
+      if self.cells is not None:
+        self.cells[index] = None   # the parameters bound to the old value keep it
+  # assign the member in the given slot through a MemberCell bound to it
+  def set_slot(self, index, val):
+    if self.shared:
+      self.slots = list(self.slots)
+      self.shared = False
+    self.slots[index] = val
+  # the value of the named member, or None if the object has no such member
+  def get(self,method):
+    index = self.shape.slots.get(method)
+    if index is None:
       return None
+    return self.slots[index]
+  def get_cell(self, method):
+    if method not in self.shape.slots:
+      return None
+    return MemberCell(self, method)
+  # (member name, value) pairs
   def value(self):
-    return self.objects.items()
+    return list(zip(self.shape.slots, self.slots))
   def type(self):
     return Type.OBJECT
   def __str__(self):
-    return f"{{method: {self.objects}}}"
+    return f"{{method: {dict(self.value())}}}"
   def __repr__(self):
     return self.__str__()
 
-class Lambda():
-  def __init__(self) -> None:
-    self.captures = []
-  def set(self, dict):
-    #print("capture")
-    self.captures.append(dict)
-  def get_recent(self):
-    #print("pass")
-    return self.captures[-1]
+# An inline cache for one place in the program that reads or writes a member (or calls a
+# method): it remembers where the member was in the last shape of object seen there, so while
+# objects of that shape keep coming the member is an indexed load from their slot array
+class InlineCache:
+  __slots__ = ('name', 'shape', 'index')
+
+  def __init__(self, name):
+    self.name = name
+    self.shape = None
+    self.index = 0
+
+  # the member's value, or None if the object has no such member
+  def get(self, obj):
+    if obj.shape is self.shape:
+      return obj.slots[self.index]
+    index = obj.shape.slots.get(self.name)
+    if index is None:
+      return None
+    self.shape = obj.shape
+    self.index = index
+    return obj.slots[index]
+
+  def set(self, obj, value):
+    if obj.shape is self.shape and not obj.shared and obj.cells is None:
+      obj.slots[self.index] = value
+      return
+    obj.set(self.name, value)
+    self.shape = obj.shape
+    self.index = obj.shape.slots[self.name]
+
 # Enumerated type for our different language data types
 class Type(Enum):
   INT = 1
@@ -43,8 +128,17 @@ class Type(Enum):
   FUNC = 5
   OBJECT = 6
 
-# Represents a value, which has a type and its value
+# Represents a value, which has a type and its value. Values are immutable, so one Value can be
+# shared by any number of variables, results, captures and parameters without being copied;
+# assigning to a variable replaces the Value in the variable's Cell instead. The values that
+# come up all the time are allocated once: Value.TRUE, Value.FALSE, Value.VOID and the small
+# ints (use Value.of_bool and Value.of_int rather than constructing those)
 class Value:
+  __slots__ = ('t', 'v')
+
+  SMALL_INT_MIN = -5
+  SMALL_INT_MAX = 256
+
   def __init__(self, type, value = None):
     self.t = type
     self.v = value
@@ -52,43 +146,414 @@ class Value:
   def value(self):
     return self.v
 
-  def set(self, other):
-    self.t = other.t
-    self.v = other.v
-
   def type(self):
     return self.t
+
+  def of_bool(value):
+    return Value.TRUE if value else Value.FALSE
+
+  def of_int(value):
+    if Value.SMALL_INT_MIN <= value <= Value.SMALL_INT_MAX:
+      return Value.SMALL_INTS[value - Value.SMALL_INT_MIN]
+    return Value(Type.INT, value)
+
+  def of_string(value):
+    return Value(Type.STRING, value)
+
   def __str__(self):
     return f"{{value: {self.v}, type: {self.t}}}"
   def __repr__(self):
     return self.__str__()
 
+Value.TRUE = Value(Type.BOOL, True)
+Value.FALSE = Value(Type.BOOL, False)
+Value.VOID = Value(Type.VOID, None)
+Value.SMALL_INTS = [Value(Type.INT, n) for n in range(Value.SMALL_INT_MIN, Value.SMALL_INT_MAX + 1)]
+
+# The storage of a variable (or object member): environments bind each name to a Cell, and
+# assigning to the variable replaces the Value in its cell. A reference parameter is bound to
+# the caller's cell, so assignments through it are seen by the caller
+class Cell:
+  __slots__ = ('value',)
+
+  def __init__(self, value):
+    self.value = value
+
+  def __repr__(self):
+    return repr(self.value)
+
+# The storage of an object member that a reference parameter is bound to; it reads and writes
+# the member through the object, so it works like the Cell of a variable
+class MemberCell:
+  __slots__ = ('object', 'index', 'cell')
+
+  def __init__(self, object, name):
+    if object.cells is None:
+      object.cells = [None] * len(object.slots)
+    self.object = object
+    self.index = object.shape.slots[name]   # a member keeps its slot for the object's lifetime
+    # the cells bound to a member share one Cell, which the object lets go of when the member is
+    # assigned other than through a cell; from then on the cells keep their own value (so the
+    # parameter's type can't change under it), just as a variable's cell would
+    self.cell = object.cells[self.index]
+    if self.cell is None:
+      self.cell = object.cells[self.index] = Cell(object.slots[self.index])
+
+  @property
+  def value(self):
+    return self.cell.value
+
+  @value.setter
+  def value(self, value):
+    self.cell.value = value
+    if self.object.cells[self.index] is self.cell:
+      self.object.set_slot(self.index, value)
+
 
 # Main interpreter class
 class Interpreter(InterpreterBase):
-  def __init__(self, console_output=True, input=None, trace_output=False):
-    super().__init__(console_output, input)
+  LINE_ENGINE = 'line'  # dispatch on each line's tokens as it executes
+  VM_ENGINE = 'vm'      # compile the program to bytecode once, then run it in a dispatch loop
+
+  QUICKEN_THRESHOLD = 8  # evaluations with the same operand type before an operation is specialized
+
+  LITERAL_TYPES = {TokenKind.INT: Type.INT, TokenKind.STRING: Type.STRING, TokenKind.BOOL: Type.BOOL}
+  # makes the Value of a python value of each type, using the shared constants where there are any
+  VALUE_OF = {Type.INT: Value.of_int, Type.STRING: Value.of_string, Type.BOOL: Value.of_bool}
+
+  def __init__(self, console_output=True, input=None, trace_output=False, engine=LINE_ENGINE,
+               adaptive=True, type_check=False, cache_dir=None, profile=False, sample_interval=None,
+               output=None, eliminate_tail_calls=True, memoize=False, memo_size=1024):
+    super().__init__(console_output, input, output)
+    if engine not in (Interpreter.LINE_ENGINE, Interpreter.VM_ENGINE):
+      raise Exception(f'Unknown engine: {engine}')
     self._setup_operations()  # setup all valid binary operations and the types they work on
     self._setup_default_values()  # setup the default values for each type (e.g., bool->False)
     self.trace_output = trace_output
+    self.engine = engine
+    self.program = None   # the prepared program
+    self.validated_source = None   # a copy of the source validate_program prepared, until it's run
+    self.adaptive = adaptive  # specialize expression operations for the operand types they see
+    self.type_check = type_check  # report statically detectable type errors before running
+    self.eliminate_tail_calls = eliminate_tail_calls  # calls in tail position reuse the caller's frame
+    # remember the results of up to memo_size calls to pure functions in self.memoizer
+    self.memoize = memoize
+    self.memo_size = memo_size
+    self.memoizer = None
+    # prepared programs are cached on disk here, if set, so the front end runs once per source
+    self.compile_cache = CompileCache(cache_dir) if cache_dir is not None else None
+    self.profile = profile  # record per-line and per-function execution statistics in self.profiler
+    self.profiler = None
+    # if set, sample the brewin call stack every sample_interval seconds into self.sampler
+    self.sample_interval = sample_interval
+    self.sampler = None
 
-  # run a program, provided in an array of strings, one string per line of source code
-  def run(self, program):
-    self.program = program
-    self._compute_indentation(program)  # determine indentation of every line
-    self.tokenized_program = Tokenizer.tokenize_program(program)
-    self.func_manager = FunctionManager(self.tokenized_program)
+  # run a program, provided in an array of strings, one string per line of source code.
+  # The optional limits make runaway programs stop deterministically with a LIMIT_ERROR:
+  # max_instructions caps the number of statements executed, max_call_depth the number of
+  # nested function calls, and max_env_size the number of variables alive at once
+  def run(self, program, max_instructions=None, max_call_depth=None, max_env_size=None):
+    # validate_program already prepared the program, unless the source has changed since
+    if self.validated_source is None or list(program) != self.validated_source:
+      self._prepare(program)
+    self.validated_source = None
+    self._execute(max_instructions, max_call_depth, max_env_size)
+
+  # run the prepared program from the start of main; only runtime state is (re)initialized here,
+  # so a prepared program can be executed any number of times (see Program)
+  def _execute(self, max_instructions=None, max_call_depth=None, max_env_size=None):
+    if self.tokenizer_error is not None:
+      error_type, line_num, description = self.tokenizer_error
+      super().error(ErrorType[error_type], description, line_num)
+    if self.type_check and self.type_checker.errors:
+      line_num, description = self.type_checker.errors[0]
+      super().error(ErrorType.TYPE_ERROR, description, line_num)
+    self.func_manager.reset()
     self.ip = self.func_manager.get_function_info(InterpreterBase.MAIN_FUNC).start_ip
     self.return_stack = []
-    self.lambda_captures = []
-    self.lambda_return_stack = []
+    self.memo_keys = []   # for each call on the return stack, the memo key its result is stored under, or None
     self.terminate = False
     self.env_manager = EnvironmentManager()   # used to track variables/scope
+    self.max_instructions = max_instructions
+    self.max_call_depth = max_call_depth
+    self.max_env_size = max_env_size
+
+    try:
+      if self.sample_interval is None:
+        self._run()
+        return
+      self.sampler = SamplingProfiler(self, self.sample_interval)
+      self.sampler.start()
+      try:
+        self._run()
+      finally:
+        self.sampler.stop()
+    finally:
+      self.output_sink.flush()
 
-    # main interpreter run loop
+  # main interpreter run loop
+  def _run(self):
+    if self.profile:
+      self.profiler = Profiler(self.program, self.jump_table, self.func_manager)
+      self.profiler.record_call(self.ip)   # main
+      self._run_profiled()
+      return
+    if self.engine == Interpreter.VM_ENGINE:
+      self._run_vm()
+      return
+    fuel = self._initial_fuel()
     while not self.terminate:
+      fuel -= 1
+      if fuel < 0:
+        self._out_of_fuel()
       self._process_line()
 
+  # the number of statements the run loop may execute
+  def _initial_fuel(self):
+    return float('inf') if self.max_instructions is None else self.max_instructions
+
+  def _out_of_fuel(self):
+    super().error(ErrorType.LIMIT_ERROR, f"Exceeded the limit of {self.max_instructions} instructions", self.ip)
+
+  # run the front end over the program (or load its results from the compile cache)
+  def _prepare(self, program):
+    self.program = program
+    self.compiled_expressions = {}   # maps the IP of each line to its compiled expression
+    self.inline_caches = {}   # maps the IP of each member assignment or method call to its InlineCache
+    self.bytecode = None   # compiled on first use by the vm engine
+    # each program's objects get their own shape tree, so it's dropped along with the program
+    self.root_shape = Shape({})
+    if self.compile_cache is None:
+      self._prepare_from_source(program)
+    else:
+      prepared = self.compile_cache.load(program)
+      if prepared is None:
+        self._prepare_from_source(program)
+        prepared = self._export_prepared(program)
+        self.compile_cache.store(program, prepared)
+      else:
+        self._restore_prepared(prepared)
+    self.tail_calls = self._find_tail_calls() if self.eliminate_tail_calls else {}
+    if self.memoize:
+      self.memoizer = Memoizer(self.tokenized_program, self.func_manager, self.type_checker.static_functions,
+                               self.memo_size)
+
+  # find the calls in tail position: a funccall of a user function followed directly (blank
+  # lines aside) by returning the result variable of the enclosing function's return type, e.g.
+  # "funccall loop n" then "return resulti". Maps the line of each such call to that return
+  # type; when the called function turns out to return the same type, the function it returns
+  # from sets the result just as the return would, so the call can replace the caller's frame
+  def _find_tail_calls(self):
+    tail_calls = {}
+    call_line = None   # a call whose next statement hasn't been seen yet
+    for line_num, tokens in enumerate(self.tokenized_program):
+      if not tokens:
+        continue
+      if call_line is not None:
+        return_type = self.func_manager.get_return_type_for_enclosing_lambda_function(call_line)
+        if return_type is None:
+          return_type = self.func_manager.get_return_type_for_enclosing_function(call_line)
+        result_var = self._result_variable_for(return_type)
+        if result_var is not None and tokens == [InterpreterBase.RETURN_DEF, result_var]:
+          tail_calls[call_line] = return_type
+      call_line = None
+      if len(tokens) > 1 and tokens[0] == InterpreterBase.FUNCCALL_DEF and tokens[1] not in FunctionManager.BUILTINS:
+        call_line = line_num
+    return tail_calls
+
+  # the result variable a function returning the named type sets, if it returns a value that a
+  # tail call can pass through (functions are returned differently, see _set_result)
+  def _result_variable_for(self, return_type):
+    value_type = self.compatible_types.get(return_type)
+    if value_type is None or value_type == "func":
+      return None
+    return InterpreterBase.RESULT_DEF + self.type_to_result[value_type]
+
+  def _prepare_from_source(self, program):
+    front_end = FrontEnd(program)   # tokens, indentation, jump table, functions and validation
+    self.indents = front_end.indents
+    self.tokenized_program = front_end.tokens
+    self.jump_table = front_end.jump_table
+    self.func_manager = front_end.func_manager
+    self.validation_error = front_end.validation_error
+    self.tokenizer_error = front_end.tokenizer_error
+    # statements proven type-safe run without their dynamic type checks
+    self.type_checker = TypeChecker(self.tokenized_program, self.func_manager)
+
+  # everything the front end computed, as cacheable data
+  def _export_prepared(self, program):
+    return {
+      'indents': self.indents,
+      'tokens': Tokenizer.export(self.tokenized_program),
+      'jump_table': self.jump_table.export(),
+      'functions': self.func_manager.export(),
+      'types': self.type_checker.export(),
+      'validation_error': self.validation_error,
+      'tokenizer_error': self.tokenizer_error,
+    }
+
+  def _restore_prepared(self, prepared):
+    self.indents = prepared['indents']
+    self.tokenized_program = Tokenizer.restore(prepared['tokens'])
+    self.jump_table = JumpTable.restore(prepared['jump_table'])
+    self.func_manager = FunctionManager.restore(prepared['functions'])
+    self.type_checker = TypeChecker.restore(prepared['types'], self.func_manager, self.tokenized_program)
+    self.validation_error = prepared['validation_error']
+    self.tokenizer_error = prepared['tokenizer_error']
+
+  # the program is validated by the front end (or its result loaded from the compile cache) as
+  # it is prepared, and a following run() of the same program doesn't prepare it again
+  def validate_program(self, program):
+    self._prepare(program)
+    self.validated_source = list(program)
+    if self.validation_error is not None:
+      error_type, line_num, description = self.validation_error
+      super().error(ErrorType[error_type], description, line_num)
+
+  # compile the program to bytecode and execute it; every instruction's handler is resolved
+  # ahead of time, so executing a line is an indexed load and a call
+  def _run_vm(self):
+    code = self._get_bytecode()
+    fuel = self._initial_fuel()
+    while not self.terminate:
+      fuel -= 1
+      if fuel < 0:
+        self._out_of_fuel()
+      if self.trace_output:
+        print(f"{self.ip:04}: {self.program[self.ip].rstrip()}")
+      handler, args = code[self.ip]
+      handler(args)
+
+  def _get_bytecode(self):
+    if self.bytecode is None:
+      handlers = self._setup_opcode_handlers()
+      self.bytecode = [self._link_instruction(line_num, opcode, args, handlers)
+                       for line_num, (opcode, args) in enumerate(Compiler.compile_program(self.tokenized_program))]
+    return self.bytecode
+
+  # resolve an instruction's operands ahead of time where the statement is well formed: the
+  # jump targets of block statements, and the compiled expressions of while conditions and of
+  # assignments and if conditions the TypeChecker proved. Such instructions get handlers that
+  # just use their operands; the rest keep the line engine's handler and their tokens
+  def _link_instruction(self, line_num, opcode, args, handlers):
+    partner = self.jump_table.get_partner(line_num)
+    proven = self.type_checker.is_proven(line_num)
+    if opcode == Opcode.NOP:
+      return (self._vm_next, None)
+    if opcode == Opcode.WHILE and args and partner is not None:
+      return (self._vm_while, (self._compile_line_expression(line_num, args), partner + 1, not proven))
+    if opcode == Opcode.ENDWHILE and partner is not None:
+      return (self._vm_endwhile, partner)
+    if opcode == Opcode.IF and args and partner is not None and proven:
+      nested_else = self.tokenized_program[partner][0] == InterpreterBase.ELSE_DEF
+      return (self._vm_if, (self._compile_line_expression(line_num, args), partner + 1, nested_else))
+    if opcode == Opcode.ELSE and partner is not None:
+      return (self._vm_else, partner + 1)
+    if opcode == Opcode.ENDIF:
+      return (self._vm_endif, None)
+    if opcode == Opcode.ASSIGN and len(args) >= 2 and proven and Tokenizer.kind_of(args[0]) != TokenKind.MEMBER:
+      return (self._vm_assign, (args[0], self._compile_line_expression(line_num, args[1:])))
+    return (handlers[opcode], args)
+
+  def _vm_next(self, operands):
+    self.ip += 1
+
+  def _vm_while(self, operands):
+    expression, exit_ip, checked = operands
+    value_type = expression()
+    if checked and value_type.type() != Type.BOOL:
+      super().error(ErrorType.TYPE_ERROR,"Non-boolean while expression", self.ip)
+    if value_type.value() == False:
+      self.ip = exit_ip
+      return
+    self.ip += 1
+    self.env_manager.block_nest()
+
+  def _vm_endwhile(self, while_ip):
+    self.env_manager.block_unnest()
+    self.ip = while_ip
+
+  def _vm_if(self, operands):
+    expression, skip_ip, nested_else = operands
+    if expression().value():
+      self.ip += 1
+      self.env_manager.block_nest()
+      return
+    self.ip = skip_ip
+    if nested_else:
+      self.env_manager.block_nest()
+
+  def _vm_else(self, endif_next_ip):
+    self.env_manager.block_unnest()
+    self.ip = endif_next_ip
+
+  def _vm_endif(self, operands):
+    self.ip += 1
+    self.env_manager.block_unnest()
+
+  def _vm_assign(self, operands):
+    name, expression = operands
+    self._set_value(name, expression())
+    self.ip += 1
+
+  # the run loop of either engine, timing every statement and counting every call for the profiler
+  def _run_profiled(self):
+    if self.engine == Interpreter.VM_ENGINE:
+      code = self._get_bytecode()
+      def execute_line():
+        if self.trace_output:
+          print(f"{self.ip:04}: {self.program[self.ip].rstrip()}")
+        handler, args = code[self.ip]
+        handler(args)
+    else:
+      execute_line = self._process_line
+    profiler = self.profiler
+    tail_calls = self.tail_calls
+    clock = time.perf_counter
+    fuel = self._initial_fuel()
+    while not self.terminate:
+      fuel -= 1
+      if fuel < 0:
+        self._out_of_fuel()
+      ip = self.ip
+      depth = len(self.return_stack)
+      start = clock()
+      execute_line()
+      profiler.record(ip, clock() - start)
+      if len(self.return_stack) > depth or (ip in tail_calls and self.ip != ip + 1):
+        profiler.record_call(self.ip)   # a call, or a tail call that replaced its caller
+
+  # map each opcode to the method that executes it; handlers all take the instruction's operands
+  def _setup_opcode_handlers(self):
+    def builtin(func):
+      def handler(args):
+        func(args)
+        self._advance_to_next_statement()
+      return handler
+    def unknown(tokens):
+      raise Exception(f'Unknown command: {tokens[0]}')
+
+    handlers = [None] * len(Opcode)
+    handlers[Opcode.NOP] = lambda args: self._blank_line()
+    handlers[Opcode.ASSIGN] = self._assign
+    handlers[Opcode.CALL] = self._call
+    handlers[Opcode.PRINT] = builtin(self._print)
+    handlers[Opcode.INPUT] = builtin(self._input)
+    handlers[Opcode.STRTOINT] = builtin(self._strtoint)
+    handlers[Opcode.FUNCCALL] = self._funccall
+    handlers[Opcode.ENDFUNC] = lambda args: self._endfunc()
+    handlers[Opcode.IF] = self._if
+    handlers[Opcode.ELSE] = lambda args: self._else()
+    handlers[Opcode.ENDIF] = lambda args: self._endif()
+    handlers[Opcode.RETURN] = self._return
+    handlers[Opcode.WHILE] = self._while
+    handlers[Opcode.ENDWHILE] = self._endwhile
+    handlers[Opcode.VAR] = self._define_var
+    handlers[Opcode.LAMBDA] = self._lambda
+    handlers[Opcode.ENDLAMBDA] = lambda args: self._endlambda()
+    handlers[Opcode.UNKNOWN] = unknown
+    return handlers
+
   def _process_line(self):
     if self.trace_output:
       print(f"{self.ip:04}: {self.program[self.ip].rstrip()}")
@@ -137,25 +602,26 @@ class Interpreter(InterpreterBase):
     for var_name in args[1:]:
       if self.env_manager.create_new_symbol(var_name) != SymbolResult.OK:
         super().error(ErrorType.NAME_ERROR,f"Redefinition of variable {args[1]}", self.ip)
+      self._check_env_size()
       # is the type a valid type?
       if args[0] not in self.type_to_default:
         super().error(ErrorType.TYPE_ERROR,f"Invalid type {args[0]}", self.ip)
       #print(self.type_to_default[args[0]].value().params)
       if args[0] == InterpreterBase.OBJECT_DEF:
-        self.env_manager.set(var_name, Value(Type.OBJECT,Object()))
+        self.env_manager.set(var_name, Cell(Value(Type.OBJECT,Object(self.root_shape))))
       elif args[0] == "func":
-        self.func_manager.set_function_info(var_name, copy.copy(self.type_to_default[args[0]]))
-        self.env_manager.set(var_name, copy.copy(self.type_to_default[args[0]]))
+        self.func_manager.set_function_info(var_name, self.type_to_default[args[0]])
+        self.env_manager.set(var_name, Cell(self.type_to_default[args[0]]))
       else:
-        self.env_manager.set(var_name, copy.copy(self.type_to_default[args[0]]))
+        self.env_manager.set(var_name, Cell(self.type_to_default[args[0]]))
 
     self._advance_to_next_statement()
   def _assign(self, tokens):
     if len(tokens) < 2:
       super().error(ErrorType.SYNTAX_ERROR,"Invalid assignment statement")
     vname = tokens[0]
-    if vname.find(".") != -1:
-      object_name, method_name = vname.split(".")
+    if Tokenizer.kind_of(vname) == TokenKind.MEMBER:
+      object_name, method_name = vname.object_name, vname.member_name
       curr_object = self._get_value(object_name)
       if curr_object == None:#TODO check errors
           super().error(ErrorType.NAME_ERROR, "Issues with this type", self.ip)
@@ -165,10 +631,11 @@ class Interpreter(InterpreterBase):
       #print(tokens, value_type.type())
       if value_type.type() == "func":
         self.func_manager.set_function_info(method_name, value_type)
-      curr_object.value().set(method_name, value_type)
-      self._set_value(object_name, curr_object)
+      self._get_inline_cache(method_name).set(curr_object.value(), value_type)
       #if isinstance(value_type, FuncInfo):#TODO changed
       #  self.func_manager.set_function_info(vname, value_type)
+    elif self.type_checker.is_proven(self.ip):
+      self._set_value(tokens[0], self._eval_expression(tokens[1:]))
     else:
       value_type = self._eval_expression(tokens[1:])
       existing_value_type = self._get_value(tokens[0])
@@ -185,21 +652,34 @@ class Interpreter(InterpreterBase):
         self._set_value(tokens[0], value_type)
     self._advance_to_next_statement()
 
+  # create a closure for the lambda starting on this line and store it in resultf. The closure
+  # is a copy of the lambda's FuncInfo holding a snapshot of just the lambda's free variables
   def _lambda(self, args):
     index = self.ip
-    env = self.env_manager.get_available_vars()
-    #self.lambda_captures.append(copy.deepcopy(env)) #storing it here
-    obj = Lambda()
-    obj.set(copy.deepcopy(env))
-    self.lambda_captures.append(copy.deepcopy(obj))
-    self._set_result(self.func_manager.get_function_info(self.func_manager.create_lambda_name(self.ip)))
-
-    #print("captured ", env['x'], env['x'].type(), env['x'].value())
-    while (self.tokenized_program[self.ip][0] != InterpreterBase.ENDLAMBDA_DEF) or self.indents[self.ip] != self.indents[index]:
-      self.ip += 1
-    self.ip += 1
+    closure = copy.copy(self.func_manager.get_function_info(self.func_manager.create_lambda_name(self.ip)))
+    closure.captures = self._capture_variables(closure.free_vars)
+    self._set_result(closure)
 
-    
+    end_line = self.jump_table.get_partner(index)
+    if end_line is None:
+      super().error(ErrorType.SYNTAX_ERROR,"Missing endlambda", index)
+    self.ip = end_line + 1
+
+  # snapshot the current values of the named variables (those that are in scope)
+  def _capture_variables(self, names):
+    captures = {}
+    for name in names:
+      cell = self.env_manager.get(name)
+      if cell is not None:
+        captures[name] = self._copy_value(cell.value)
+    return captures
+
+  # copy a value so that changing the copy doesn't affect the original. Values are immutable, so
+  # only objects need copying: they're captured by value too. Object copies are copy-on-write
+  def _copy_value(self, value):
+    if isinstance(value, Value) and value.type() == Type.OBJECT:
+      return Value(Type.OBJECT, value.value().copy())
+    return value
 
   def _endlambda(self, return_val = None):
     #print("r")
@@ -207,15 +687,17 @@ class Interpreter(InterpreterBase):
       self.terminate = True
     else:
       self.env_manager.pop()  # get rid of environment for the function
-      if return_val:
-        self._set_result(return_val)
-      else:
+      if not return_val:
         # return default value for type if no return value is specified. Last param of True enables
         # creation of result variable even if none exists, or is of a different type
         
         return_type = self.func_manager.get_return_type_for_enclosing_lambda_function(self.ip)
         if return_type != InterpreterBase.VOID_DEF:
-          self._set_result(self.type_to_default[return_type])
+          return_val = self._default_value(return_type)
+      if return_val:
+        self._set_result(return_val)
+      if self.memoizer is not None:
+        self._memoize_result(return_val)
       
     self.ip = self.return_stack.pop()
 
@@ -232,28 +714,92 @@ class Interpreter(InterpreterBase):
       self._strtoint(args[1:])
       self._advance_to_next_statement()
     else:
-      self.return_stack.append(self.ip+1)
-      #print(self.ip)
-      self._create_new_environment(args[0], args[1:])  # Create new environment, copy args into new env
-      #print(self.env_manager.get_available_vars())
+      self._call(args)
+
+  # call a user-defined function, lambda or method: args is the function name then its arguments
+  def _call(self, args):
+    memo_key = None
+    if self.memoizer is not None:
+      memo_key = self._get_memo_key(args[0], args[1:])
+      if memo_key is not None:
+        result = self.memoizer.lookup(memo_key)
+        if result is not None:
+          self._set_result(result)
+          self._advance_to_next_statement()
+          return
+    tail_call_type = self.tail_calls.get(self.ip)
+    if tail_call_type is not None and self._get_return_type(args[0]) == tail_call_type:
+      # the frame's result is stored under the key of the call that pushed it only, so a long
+      # chain of tail calls doesn't build up keys (or flood the memo table)
+      self._create_new_environment(args[0], args[1:], replace_frame=True)
+      return
+    if self.max_call_depth is not None and len(self.return_stack) >= self.max_call_depth:
+      super().error(ErrorType.LIMIT_ERROR, f"Exceeded the limit of {self.max_call_depth} nested calls", self.ip)
+    self.return_stack.append(self.ip+1)
+    if self.memoizer is not None:
+      self.memo_keys.append(memo_key)
+    #print(self.ip)
+    self._create_new_environment(args[0], args[1:])  # Create new environment, copy args into new env
+    #print(self.env_manager.get_available_vars())
       
         
 
 
-  # create a new environment for a function call
-  def _create_new_environment(self, funcname, args):
+  # the key to memoize a call under: the called function and the types and values of the
+  # arguments. None if the function isn't pure, or the call is going to fail anyway
+  def _get_memo_key(self, funcname, args):
+    func_info = self.func_manager.get_function_info(funcname)
+    if not isinstance(func_info, FuncInfo) or not self.memoizer.is_pure(func_info) \
+       or len(args) != len(func_info.params):
+      return None
+    key = [func_info.start_ip]
+    for actual in args:
+      arg = self._get_value(actual)
+      if not isinstance(arg, Value):
+        return None
+      key += (arg.t, arg.v)
+    return tuple(key)
+
+  # store the result of the call that's returning under its memo key
+  def _memoize_result(self, result):
+    key = self.memo_keys.pop()
+    if key is not None:
+      self.memoizer.store(key, result)
+
+  # hit and miss counts of the memo table (see Memoizer.get_stats), or None if not memoizing
+  def get_memo_stats(self):
+    if self.memoizer is None:
+      return None
+    return self.memoizer.get_stats()
+
+  # the declared return type of the function, lambda or method called by name, if known
+  def _get_return_type(self, funcname):
+    if Tokenizer.kind_of(funcname) == TokenKind.MEMBER:
+      funcname = funcname.member_name
+    func_info = self.func_manager.get_function_info(funcname)
+    if not isinstance(func_info, FuncInfo):
+      return None
+    return func_info.return_type
+
+  # create a new environment for a function call. For a tail call (replace_frame) it replaces
+  # the calling function's environment, once the arguments have been evaluated in it, and the
+  # call returns to wherever the calling function would have returned
+  def _create_new_environment(self, funcname, args, replace_frame=False):
     object = ""
     method = False
-    if '.' in funcname:
-      obj, methods = funcname.split('.')
-      object = obj
-      funcname = methods
+    if Tokenizer.kind_of(funcname) == TokenKind.MEMBER:
+      object = funcname.object_name
+      funcname = funcname.member_name
       method = True
       #print(funcname)
       formal_params = self.func_manager.get_function_info(funcname)
       if formal_params is None:
         super().error(ErrorType.NAME_ERROR, f"Unknown function name {funcname}", self.ip)
-      if self.env_manager.get(object).value().get(funcname)[funcname].type() != "func":
+      curr_object = self._get_value(object)
+      if curr_object.type() != Type.OBJECT:
+        super().error(ErrorType.TYPE_ERROR, "Not an object type", self.ip)
+      member = self._get_inline_cache(funcname).get(curr_object.value())
+      if member is None or member.type() != "func":
         super().error(ErrorType.TYPE_ERROR, "Incorrect func type", self.ip)
       
       if formal_params == None:
@@ -264,60 +810,62 @@ class Interpreter(InterpreterBase):
       method = False
       formal_params = self.func_manager.get_function_info(funcname)
       
-    divisor = funcname.find(".")	
-    if divisor != -1:	
-      if self.env_manager.get(object).value().get(funcname) is None:
-        super().error(ErrorType.TYPE_ERROR, "Incorrect func type", self.ip)
     if formal_params is None:
       super().error(ErrorType.NAME_ERROR, f"Unknown function name {funcname}", self.ip)
     #print(formal_params.params, args)
     if len(formal_params.params) != len(args):
       super().error(ErrorType.NAME_ERROR,f"Mismatched parameter count in call to {funcname}", self.ip)
 
+    checked = not self.type_checker.is_proven(self.ip)   # are the argument types already known to match?
     tmp_mappings = {}
     if method:
       #print("here")
-      tmp_mappings["this"] = self._get_value(object)
+      tmp_mappings["this"] = self._get_cell(object, curr_object)
     for formal, actual in zip(formal_params.params,args):
       formal_name = formal[0]
       formal_typename = formal[1]
       arg = self._get_value(actual)
-      if arg.type() != self.compatible_types[formal_typename]:
+      if checked and arg.type() != self.compatible_types[formal_typename]:
         super().error(ErrorType.TYPE_ERROR,f"Mismatched parameter type for {formal_name} in call to {funcname}", self.ip)
       #print(formal_name,arg.value())
       if isinstance(arg, FuncInfo):
-        self.func_manager.set_function_info(formal_name, copy.deepcopy(arg))
+        self.func_manager.set_function_info(formal_name, copy.copy(arg))  # captures are never mutated
       if formal_typename in self.reference_types:
-        tmp_mappings[formal_name] = arg
+        tmp_mappings[formal_name] = self._get_cell(actual, arg)
       else:
-        tmp_mappings[formal_name] = copy.copy(arg)
+        tmp_mappings[formal_name] = Cell(arg)
 
     # create a new environment for the target function
     # and add our parameters to the env
+    if replace_frame:
+      self.env_manager.pop()
     self.env_manager.push()
     self.ip = self._find_first_instruction(funcname)
-    if self.func_manager.get_return_type_for_enclosing_lambda_function(self.ip-1) != None:
-      if len(self.lambda_captures) == 0:
-        self.env_manager.import_mappings({})
-      else:
-        self.env_manager.import_mappings(self.lambda_captures[-1].get_recent())
-        
+    if formal_params.captures:
+      # copy the captured values so the call can't change the closure's snapshot
+      self.env_manager.import_mappings({name: Cell(self._copy_value(value)) for name, value in formal_params.captures.items()})
     self.env_manager.import_mappings(tmp_mappings)
-    
+    self._check_env_size()
+
+  def _check_env_size(self):
+    if self.max_env_size is not None and self.env_manager.size > self.max_env_size:
+      super().error(ErrorType.LIMIT_ERROR, f"Exceeded the limit of {self.max_env_size} variables", self.ip)
 
   def _endfunc(self, return_val = None):
     if not self.return_stack:  # done with main!
       self.terminate = True
     else:
       self.env_manager.pop()  # get rid of environment for the function
-      if return_val:
-        self._set_result(return_val)
-      else:
+      if not return_val:
         # return default value for type if no return value is specified. Last param of True enables
         # creation of result variable even if none exists, or is of a different type
         return_type = self.func_manager.get_return_type_for_enclosing_function(self.ip)
         if return_type != InterpreterBase.VOID_DEF:
-          self._set_result(self.type_to_default[return_type])
+          return_val = self._default_value(return_type)
+      if return_val:
+        self._set_result(return_val)
+      if self.memoizer is not None:
+        self._memoize_result(return_val)
       self.ip = self.return_stack.pop()
 
   def _if(self, args):
@@ -325,27 +873,23 @@ class Interpreter(InterpreterBase):
     if not args:
       super().error(ErrorType.SYNTAX_ERROR,"Invalid if syntax", self.ip)
     value_type = self._eval_expression(args)
-    if value_type.type() == Type.OBJECT:
-      value_type = self._get_value(str(value_type.value()))
-    if value_type.type() != Type.BOOL:
-      super().error(ErrorType.TYPE_ERROR,"Non-boolean if expression", self.ip)
+    if not self.type_checker.is_proven(self.ip):
+      if value_type.type() == Type.OBJECT:
+        value_type = self._get_value(str(value_type.value()))
+      if value_type.type() != Type.BOOL:
+        super().error(ErrorType.TYPE_ERROR,"Non-boolean if expression", self.ip)
     #print(value_type.value())
     if value_type.value():
       self._advance_to_next_statement()
       self.env_manager.block_nest()  # we're in a nested block, so create new env for it
       return
     else:
-      for line_num in range(self.ip+1, len(self.tokenized_program)):
-        tokens = self.tokenized_program[line_num]
-        if not tokens:
-          continue
-        if tokens[0] == InterpreterBase.ENDIF_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          return
-        if tokens[0] == InterpreterBase.ELSE_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
+      line_num = self.jump_table.get_partner(self.ip)   # matching else, or endif if there's no else
+      if line_num is not None:
+        self.ip = line_num + 1
+        if self.tokenized_program[line_num][0] == InterpreterBase.ELSE_DEF:
           self.env_manager.block_nest()  # we're in a nested else block, so create new env for it
-          return
+        return
     super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip)
 
   def _endif(self):
@@ -356,18 +900,21 @@ class Interpreter(InterpreterBase):
   # so we need to delete the old top environment
   def _else(self):
     self.env_manager.block_unnest()   # Get rid of env for block above
-    for line_num in range(self.ip+1, len(self.tokenized_program)):
-      tokens = self.tokenized_program[line_num]
-      if not tokens:
-        continue
-      if tokens[0] == InterpreterBase.ENDIF_DEF and self.indents[self.ip] == self.indents[line_num]:
-          self.ip = line_num + 1
-          return
+    line_num = self.jump_table.get_partner(self.ip)
+    if line_num is not None:
+      self.ip = line_num + 1
+      return
     super().error(ErrorType.SYNTAX_ERROR,"Missing endif", self.ip)
 
   def _return(self,args):
     # do we want to support returns without values?
     lambda_type = self.func_manager.get_return_type_for_enclosing_lambda_function(self.ip)
+    if self.type_checker.is_proven(self.ip):
+      if lambda_type != None:
+        self._endlambda(self._eval_expression(args))
+      else:
+        self._endfunc(self._eval_expression(args))
+      return
     if lambda_type != None:
       return_type = lambda_type
     else:
@@ -408,7 +955,7 @@ class Interpreter(InterpreterBase):
     if not args:
       super().error(ErrorType.SYNTAX_ERROR,"Missing while expression", self.ip)
     value_type = self._eval_expression(args)
-    if value_type.type() != Type.BOOL:
+    if value_type.type() != Type.BOOL and not self.type_checker.is_proven(self.ip):
       super().error(ErrorType.TYPE_ERROR,"Non-boolean while expression", self.ip)
     if value_type.value() == False:
       self._exit_while()
@@ -420,30 +967,20 @@ class Interpreter(InterpreterBase):
     self.env_manager.block_nest()
 
   def _exit_while(self):
-    while_indent = self.indents[self.ip]
-    cur_line = self.ip + 1
-    while cur_line < len(self.tokenized_program):
-      if self.tokenized_program[cur_line][0] == InterpreterBase.ENDWHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line + 1
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line += 1
+    cur_line = self.jump_table.get_partner(self.ip)
+    if cur_line is not None:
+      self.ip = cur_line + 1
+      return
     # didn't find endwhile
     super().error(ErrorType.SYNTAX_ERROR,"Missing endwhile", self.ip)
 
   def _endwhile(self, args):
     # first delete the scope
     self.env_manager.block_unnest()
-    while_indent = self.indents[self.ip]
-    cur_line = self.ip - 1
-    while cur_line >= 0:
-      if self.tokenized_program[cur_line][0] == InterpreterBase.WHILE_DEF and self.indents[cur_line] == while_indent:
-        self.ip = cur_line
-        return
-      if self.tokenized_program[cur_line] and self.indents[cur_line] < self.indents[self.ip]:
-        break # syntax error!
-      cur_line -= 1
+    cur_line = self.jump_table.get_partner(self.ip)
+    if cur_line is not None:
+      self.ip = cur_line
+      return
     # didn't find while
     super().error(ErrorType.SYNTAX_ERROR,"Missing while", self.ip)
 
@@ -471,22 +1008,29 @@ class Interpreter(InterpreterBase):
     value_type = self._get_value(args[0])
     if value_type.type() != Type.STRING:
       super().error(ErrorType.TYPE_ERROR,"Non-string passed to strtoint", self.ip)
-    self._set_result(Value(Type.INT, int(value_type.value())))   # return always passed back in result
+    self._set_result(Value.of_int(int(value_type.value())))   # return always passed back in result
 
   def _advance_to_next_statement(self):
     # for now just increment IP, but later deal with loops, returns, end of functions, etc.
     self.ip += 1
 
+  # the value a function of this return type returns if it doesn't set one; each default object
+  # is a new one, since the caller may add members to it
+  def _default_value(self, return_type):
+    if return_type == InterpreterBase.OBJECT_DEF:
+      return Value(Type.OBJECT, Object(self.root_shape))
+    return self.type_to_default[return_type]
+
   # Set up type-related data structures
   def _setup_default_values(self):
     # set up what value to return as the default value for each type
     self.type_to_default = {}
-    self.type_to_default[InterpreterBase.INT_DEF] = Value(Type.INT,0)
+    self.type_to_default[InterpreterBase.INT_DEF] = Value.of_int(0)
     self.type_to_default[InterpreterBase.STRING_DEF] = Value(Type.STRING,'')
-    self.type_to_default[InterpreterBase.BOOL_DEF] = Value(Type.BOOL,False)
-    self.type_to_default[InterpreterBase.VOID_DEF] = Value(Type.VOID,None)
+    self.type_to_default[InterpreterBase.BOOL_DEF] = Value.FALSE
+    self.type_to_default[InterpreterBase.VOID_DEF] = Value.VOID
     self.type_to_default[InterpreterBase.FUNC_DEF] = Value("func",None)#TODO Double check
-    self.type_to_default[InterpreterBase.OBJECT_DEF] = Value(Type.OBJECT, Object())
+    self.type_to_default[InterpreterBase.OBJECT_DEF] = Value(Type.OBJECT, Object(Shape({})))
 
     # set up what types are compatible with what other types
     self.compatible_types = {}
@@ -514,36 +1058,57 @@ class Interpreter(InterpreterBase):
     self.binary_op_list = ['+','-','*','/','%','==','!=', '<', '<=', '>', '>=', '&', '|']
     self.binary_ops = {}
     self.binary_ops[Type.INT] = {
-     '+': lambda a,b: Value(Type.INT, a.value()+b.value()),
-     '-': lambda a,b: Value(Type.INT, a.value()-b.value()),
-     '*': lambda a,b: Value(Type.INT, a.value()*b.value()),
-     '/': lambda a,b: Value(Type.INT, a.value()//b.value()),  # // for integer ops
-     '%': lambda a,b: Value(Type.INT, a.value()%b.value()),
-     '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
-     '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
-     '>': lambda a,b: Value(Type.BOOL, a.value()>b.value()),
-     '<': lambda a,b: Value(Type.BOOL, a.value()<b.value()),
-     '>=': lambda a,b: Value(Type.BOOL, a.value()>=b.value()),
-     '<=': lambda a,b: Value(Type.BOOL, a.value()<=b.value()),
+     '+': lambda a,b: Value.of_int(a.value()+b.value()),
+     '-': lambda a,b: Value.of_int(a.value()-b.value()),
+     '*': lambda a,b: Value.of_int(a.value()*b.value()),
+     '/': lambda a,b: Value.of_int(a.value()//b.value()),  # // for integer ops
+     '%': lambda a,b: Value.of_int(a.value()%b.value()),
+     '==': lambda a,b: Value.of_bool(a.value()==b.value()),
+     '!=': lambda a,b: Value.of_bool(a.value()!=b.value()),
+     '>': lambda a,b: Value.of_bool(a.value()>b.value()),
+     '<': lambda a,b: Value.of_bool(a.value()<b.value()),
+     '>=': lambda a,b: Value.of_bool(a.value()>=b.value()),
+     '<=': lambda a,b: Value.of_bool(a.value()<=b.value()),
     }
     self.binary_ops[Type.STRING] = {
-     '+': lambda a,b: Value(Type.STRING, a.value()+b.value()),
-     '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
-     '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
-     '>': lambda a,b: Value(Type.BOOL, a.value()>b.value()),
-     '<': lambda a,b: Value(Type.BOOL, a.value()<b.value()),
-     '>=': lambda a,b: Value(Type.BOOL, a.value()>=b.value()),
-     '<=': lambda a,b: Value(Type.BOOL, a.value()<=b.value()),
+     '+': lambda a,b: Value.of_string(a.value()+b.value()),
+     '==': lambda a,b: Value.of_bool(a.value()==b.value()),
+     '!=': lambda a,b: Value.of_bool(a.value()!=b.value()),
+     '>': lambda a,b: Value.of_bool(a.value()>b.value()),
+     '<': lambda a,b: Value.of_bool(a.value()<b.value()),
+     '>=': lambda a,b: Value.of_bool(a.value()>=b.value()),
+     '<=': lambda a,b: Value.of_bool(a.value()<=b.value()),
     }
     self.binary_ops[Type.BOOL] = {
-     '&': lambda a,b: Value(Type.BOOL, a.value() and b.value()),
-     '==': lambda a,b: Value(Type.BOOL, a.value()==b.value()),
-     '!=': lambda a,b: Value(Type.BOOL, a.value()!=b.value()),
-     '|': lambda a,b: Value(Type.BOOL, a.value() or b.value())
+     '&': lambda a,b: Value.of_bool(a.value() and b.value()),
+     '==': lambda a,b: Value.of_bool(a.value()==b.value()),
+     '!=': lambda a,b: Value.of_bool(a.value()!=b.value()),
+     '|': lambda a,b: Value.of_bool(a.value() or b.value())
     }
 
-  def _compute_indentation(self, program):
-    self.indents = [len(line) - len(line.lstrip(' ')) for line in program]
+    # the same operations on the underlying python values, with the type of their result; used
+    # by operations that have been specialized for a single operand type
+    comparisons = {'==': operator.eq, '!=': operator.ne, '>': operator.gt, '<': operator.lt,
+                   '>=': operator.ge, '<=': operator.le}
+    self.raw_binary_ops = {}
+    self.raw_binary_ops[Type.INT] = {
+     '+': (operator.add, Type.INT),
+     '-': (operator.sub, Type.INT),
+     '*': (operator.mul, Type.INT),
+     '/': (operator.floordiv, Type.INT),
+     '%': (operator.mod, Type.INT),
+     **{op: (func, Type.BOOL) for op, func in comparisons.items()},
+    }
+    self.raw_binary_ops[Type.STRING] = {
+     '+': (operator.add, Type.STRING),
+     **{op: (func, Type.BOOL) for op, func in comparisons.items()},
+    }
+    self.raw_binary_ops[Type.BOOL] = {
+     '&': (lambda a,b: a and b, Type.BOOL),
+     '==': (operator.eq, Type.BOOL),
+     '!=': (operator.ne, Type.BOOL),
+     '|': (lambda a,b: a or b, Type.BOOL),
+    }
 
   def _find_first_instruction(self, funcname, dummy = False):
     func_info = self.func_manager.get_function_info(funcname)
@@ -557,54 +1122,65 @@ class Interpreter(InterpreterBase):
 
   def _get_value(self, token):
     #print(token)
-    if not token:
-      super().error(ErrorType.NAME_ERROR,f"Empty token", self.ip)
-    if token[0] == '"':
-      return Value(Type.STRING, token.strip('"'))
-    if token.isdigit() or token[0] == '-':
-      return Value(Type.INT, int(token))
-    if token == InterpreterBase.TRUE_DEF or token == Interpreter.FALSE_DEF:
-      return Value(Type.BOOL, token == InterpreterBase.TRUE_DEF)
-    if token.find(".") != -1:
-      object_name, method_name = token.split(".")
+    kind = Tokenizer.kind_of(token)
+    if kind in Interpreter.LITERAL_TYPES:
+      return Interpreter.VALUE_OF[Interpreter.LITERAL_TYPES[kind]](token.value)
+    if kind == TokenKind.MEMBER:
+      object_name, method_name = token.object_name, token.member_name
       curr_object = self._get_value(object_name)
       if curr_object.type() != Type.OBJECT: #TODO
         super().error(ErrorType.TYPE_ERROR, "", self.ip)
-      if curr_object.value() == None or curr_object.value().get(method_name) == None:
+      member = curr_object.value().get(method_name) if curr_object.value() is not None else None
+      if member is None:
         super().error(ErrorType.NAME_ERROR, "", self.ip)
-      return curr_object.value().get(method_name)[method_name]
-      
-      #print( curr_object.get(method_name)[method_name])
-      #return Value(Type.OBJECT, curr_object.get(method_name)[method_name].value())
-    if self.func_manager.get_function_info(token) != None:
-      #print("her")
-      return self.func_manager.get_function_info(token)
+      return member
+    return self._get_variable(token)
+
+  # given a variable or function name, give us the Value (or FuncInfo) currently bound to it
+  def _get_variable(self, name):
+    func_info = self.func_manager.get_function_info(name)
+    if func_info != None:
+      return func_info
 
-    val = self.env_manager.get(token)
-    if val != None:
-      return val
-    super().error(ErrorType.NAME_ERROR,f"Unknown variable {token}", self.ip)
+    cell = self.env_manager.get(name)
+    if cell is not None:
+      return cell.value
+    super().error(ErrorType.NAME_ERROR,f"Unknown variable {name}", self.ip)
+
+  # the Cell holding a variable or object member, to bind a reference parameter to; value is
+  # the token's current value. Anything else (e.g., a literal) gets a cell of its own
+  def _get_cell(self, token, value):
+    if Tokenizer.kind_of(token) == TokenKind.MEMBER:
+      cell = self._get_value(token.object_name).value().get_cell(token.member_name)
+    else:
+      cell = self.env_manager.get(token)
+    if cell is not None and cell.value is value:
+      return cell
+    return Cell(value)
+
+  # the inline cache for the member assigned or method called on the current line (a line has at
+  # most one of them)
+  def _get_inline_cache(self, name):
+    cache = self.inline_caches.get(self.ip)
+    if cache is None:
+      cache = self.inline_caches[self.ip] = InlineCache(name)
+    return cache
 
   # given a variable name and a Value object, associate the name with the value
   def _set_value(self, varname, to_value_type):
-    value_type = self.env_manager.get(varname)
-    if value_type == None:
+    cell = self.env_manager.get(varname)
+    if cell is None:
       super().error(ErrorType.NAME_ERROR,f"Assignment of unknown variable {varname}", self.ip)
-    value_type.set(to_value_type)
+    cell.value = to_value_type
 
   # bind the result[s,i,b] variable in the calling function's scope to the proper Value object
   def _set_result(self, value_type):
     # always stores result in the highest-level block scope for a function, so nested if/while blocks
     # don't each have their own version of result
     #print(value_type)
+    # objects are returned by reference, like they're assigned and passed, so an object result
+    # is never copied
     result_var = InterpreterBase.RESULT_DEF + self.type_to_result[value_type.type()]
-    
-    if value_type.type() == Type.OBJECT:
-      self.env_manager.create_new_symbol(result_var, True)
-      new_obj = Object()
-      for key,val in value_type.value().value():
-        new_obj.set(key, copy.copy(val)) #TODO deepcopy
-      self.env_manager.set(result_var, Value(Type.OBJECT, new_obj))
     if result_var == "resultf":
       self.env_manager.create_new_symbol(result_var, False)
       #print(value_type.start_ip)
@@ -612,41 +1188,183 @@ class Interpreter(InterpreterBase):
       pass
     else:
       self.env_manager.create_new_symbol(result_var, True)  # create in top block if it doesn't exist
-      self.env_manager.set(result_var, copy.copy(value_type))
+      self.env_manager.set(result_var, Cell(value_type))
 
   # evaluate expressions in prefix notation: + 5 * 6 x
+  # each line has at most one expression, so it is compiled the first time its line runs and
+  # the compiled form is reused on every later execution of that line
   def _eval_expression(self, tokens):
+    expression = self.compiled_expressions.get(self.ip)
+    if expression is None:
+      expression = self._compile_line_expression(self.ip, tokens)
+    return expression()
+
+  # the compiled form of the expression on the given line, compiled on first use
+  def _compile_line_expression(self, line_num, tokens):
+    expression = self.compiled_expressions.get(line_num)
+    if expression is None:
+      if self.type_checker.is_proven(line_num):
+        expression, _ = self._compile_typed_expression(tokens, self.type_checker.get_line_types(line_num))
+      else:
+        expression = self._compile_expression(tokens)
+      self.compiled_expressions[line_num] = expression
+    return expression
+
+  # compile a prefix expression into a tree of closures; calling the root evaluates the
+  # expression. Literals are parsed, operators looked up and names bound here, once, so
+  # evaluation does none of the token classification that _get_value does
+  def _compile_expression(self, tokens):
     stack = []
 
     for token in reversed(tokens):
       if token in self.binary_op_list:
-        v1 = stack.pop()
-        v2 = stack.pop()
-        if v1.type() != v2.type():
-          super().error(ErrorType.TYPE_ERROR,f"Mismatching types {v1.type()} and {v2.type()}", self.ip)
-        operations = self.binary_ops[v1.type()]
-        if token not in operations:
-          super().error(ErrorType.TYPE_ERROR,f"Operator {token} is not compatible with {v1.type()}", self.ip)
-        #print("gr",v1.value(),v2.value())
-        stack.append(operations[token](v1,v2))
+        if len(stack) < 2:
+          return self._compile_invalid_expression()
+        left = stack.pop()
+        right = stack.pop()
+        stack.append(self._compile_binary_operation(token, left, right))
       elif token == '!':
-        v1 = stack.pop()
-        if v1.type() != Type.BOOL:
-          super().error(ErrorType.TYPE_ERROR,f"Expecting boolean for ! {v1.type()}", self.ip)
-        stack.append(Value(Type.BOOL, not v1.value()))
-      elif token.find('.') != -1:
-        object_name, method_name = token.split(".")
-        curr_object = self._get_value(object_name)
-        #print(curr_object.value())
-        #TODO add error checking
-        #print("eval", curr_object.value().get(method_name)[method_name])
-        value_type = curr_object.value().get(method_name)[method_name]
-        stack.append(value_type)
+        if not stack:
+          return self._compile_invalid_expression()
+        stack.append(self._compile_not(stack.pop()))
       else:
-        value_type = self._get_value(token)
-        stack.append(value_type)
+        stack.append(self._compile_operand(token))
 
     if len(stack) != 1:
-      super().error(ErrorType.SYNTAX_ERROR,f"Invalid expression", self.ip)
+      return self._compile_invalid_expression()
+
+    return stack[0]
+
+  # compile an expression the TypeChecker has proven well-typed, given the static types of the
+  # names it uses; operations are chosen at compile time and nothing is type checked at runtime.
+  # Returns the compiled expression and its type
+  def _compile_typed_expression(self, tokens, types):
+    stack = []
+
+    for token in reversed(tokens):
+      if token in self.binary_op_list:
+        left, operand_type = stack.pop()
+        right, _ = stack.pop()
+        raw_operation, result_type = self.raw_binary_ops[operand_type][token]
+        stack.append((self._compile_typed_binary_operation(raw_operation, result_type, left, right), result_type))
+      elif token == '!':
+        operand, _ = stack.pop()
+        stack.append((lambda operand=operand: Value.of_bool(not operand().v), Type.BOOL))
+      else:
+        stack.append((self._compile_operand(token), self.compatible_types[types[token]]))
 
     return stack[0]
+
+  def _compile_typed_binary_operation(self, raw_operation, result_type, left, right):
+    value_of = Interpreter.VALUE_OF[result_type]
+    def evaluate():
+      v2 = right()
+      v1 = left()
+      return value_of(raw_operation(v1.v, v2.v))
+    return evaluate
+
+  def _compile_invalid_expression(self):
+    def evaluate():
+      self.error(ErrorType.SYNTAX_ERROR,f"Invalid expression", self.ip)
+    return evaluate
+
+  def _compile_binary_operation(self, op, left, right):
+    # the implementation of this operator for each type that supports it
+    operations = {t: ops[op] for t, ops in self.binary_ops.items() if op in ops}
+    raw_operations = {t: ops[op] for t, ops in self.raw_binary_ops.items() if op in ops}
+    adaptive = self.adaptive
+    # adaptive state: once the operands have had the same type QUICKEN_THRESHOLD times in a row
+    # the operation is specialized for that type: it just guards on the operand types and then
+    # applies the raw python operator. A guard failure deoptimizes it back to the generic path
+    specialized_type = raw_operation = value_of = None
+    seen_type = None
+    seen_count = 0
+    def evaluate():
+      nonlocal specialized_type, raw_operation, value_of, seen_type, seen_count
+      v2 = right()   # operands are evaluated right to left, as they're read off the token list
+      v1 = left()
+      if specialized_type is not None:
+        # a name bound in the FunctionManager reads as a FuncInfo rather than a Value
+        if (v1.__class__ is Value and v2.__class__ is Value
+            and v1.t is specialized_type and v2.t is specialized_type):
+          return value_of(raw_operation(v1.v, v2.v))
+        specialized_type = None
+        seen_count = 0
+      if v1.type() != v2.type():
+        self.error(ErrorType.TYPE_ERROR,f"Mismatching types {v1.type()} and {v2.type()}", self.ip)
+      operation = operations.get(v1.type())
+      if operation is None:
+        self.error(ErrorType.TYPE_ERROR,f"Operator {op} is not compatible with {v1.type()}", self.ip)
+      if adaptive:
+        if v1.t is seen_type:
+          seen_count += 1
+          if seen_count >= Interpreter.QUICKEN_THRESHOLD:
+            specialized_type = seen_type
+            raw_operation, result_type = raw_operations[seen_type]
+            value_of = Interpreter.VALUE_OF[result_type]
+        else:
+          seen_type = v1.t
+          seen_count = 1
+      return operation(v1,v2)
+    return evaluate
+
+  def _compile_not(self, operand):
+    def evaluate():
+      v1 = operand()
+      if v1.type() != Type.BOOL:
+        self.error(ErrorType.TYPE_ERROR,f"Expecting boolean for ! {v1.type()}", self.ip)
+      return Value.of_bool(not v1.value())
+    return evaluate
+
+  # compile a literal, variable or object member reference
+  def _compile_operand(self, token):
+    kind = Tokenizer.kind_of(token)
+    if kind in Interpreter.LITERAL_TYPES:
+      value = Interpreter.VALUE_OF[Interpreter.LITERAL_TYPES[kind]](token.value)
+      return lambda: value
+    if kind == TokenKind.MEMBER:
+      return self._compile_member(token)
+    get_variable = self._get_variable
+    return lambda: get_variable(token)
+
+  # compile a read of an object member; the read has its own inline cache
+  def _compile_member(self, token):
+    object_name = token.object_name
+    cache = InlineCache(token.member_name)
+    get_variable = self._get_variable
+    get_value = self._get_value
+    def evaluate():
+      curr_object = get_variable(object_name)
+      if curr_object.__class__ is Value and curr_object.t is Type.OBJECT:
+        member = cache.get(curr_object.v)
+        if member is not None:
+          return member
+      return get_value(token)   # not an object, or no such member: report the error
+    return evaluate
+
+# A brewin program that is prepared once (tokenized, analysed and, for the vm engine, compiled)
+# and can then be run any number of times, e.g., against many different inputs. Every run shares
+# the prepared state and the interpreter's operation tables; only the runtime state is reset.
+# Takes the same keyword options as Interpreter.
+class Program:
+  def __init__(self, source, console_output=False, **options):
+    self.interpreter = Interpreter(console_output, None, **options)
+    self.interpreter._prepare(source)
+
+  # run the program with the given input lines and return its output lines; errors are raised
+  # just as Interpreter.run raises them, and the limits are the same as Interpreter.run's. If an
+  # output sink is given, this run prints to it instead (and returns what it keeps, if anything)
+  def run(self, input=None, max_instructions=None, max_call_depth=None, max_env_size=None, output=None):
+    default_output = self.interpreter.output_sink
+    if output is not None:
+      self.interpreter.output_sink = output
+    try:
+      self.interpreter.input = input
+      self.interpreter.reset()
+      self.interpreter._execute(max_instructions, max_call_depth, max_env_size)
+      return self.interpreter.get_output()
+    finally:
+      self.interpreter.output_sink = default_output
+
+  def get_error_type_and_line(self):
+    return self.interpreter.get_error_type_and_line()
@@ -0,0 +1,74 @@
+from intbase import InterpreterBase
+
+# JumpTable precomputes, for every block statement in a tokenized program, the line number of
+# its matching partner so the interpreters can transfer control in constant time instead of
+# scanning the program for the terminator every time the statement executes:
+#   if -> else (if there is one) otherwise endif
+#   else -> endif
+#   while -> endwhile, endwhile -> while
+#   lambda -> endlambda
+#   func -> endfunc
+# Blocks are matched the same way the interpreters always did: a terminator belongs to the
+# nearest open block of the right kind at the same indentation.
+class JumpTable:
+  BLOCK_ENDS = {
+    InterpreterBase.ENDIF_DEF: InterpreterBase.IF_DEF,
+    InterpreterBase.ENDWHILE_DEF: InterpreterBase.WHILE_DEF,
+    InterpreterBase.ENDLAMBDA_DEF: InterpreterBase.LAMBDA_DEF,
+    InterpreterBase.ENDFUNC_DEF: InterpreterBase.FUNC_DEF,
+  }
+  BLOCK_STARTS = set(BLOCK_ENDS.values())
+
+  def __init__(self, tokenized_program, indents):
+    self.partners = []
+    self.open_blocks = []  # entries are [line_num, keyword, indent, else_line_num]
+    for tokens, indent in zip(tokenized_program, indents):
+      self.add_line(tokens, indent)
+
+  # returns the line number of the matching partner of the block statement on line_num,
+  # or None if the block has no (well-formed) partner
+  def get_partner(self, line_num):
+    return self.partners[line_num]
+
+  # the table as plain python data (e.g., for caching); JumpTable.restore() rebuilds it
+  def export(self):
+    return self.partners
+
+  def restore(exported):
+    jump_table = JumpTable([], [])
+    jump_table.partners = list(exported)
+    return jump_table
+
+  # match the next line of the program against the blocks still open; lines are added in order,
+  # so the table can be built in the same pass as other front end work (see FrontEnd)
+  def add_line(self, tokens, indent):
+    line_num = len(self.partners)
+    self.partners.append(None)
+    if not tokens:
+      return
+    keyword = tokens[0]
+    if keyword in JumpTable.BLOCK_STARTS:
+      self.open_blocks.append([line_num, keyword, indent, None])
+    elif keyword == InterpreterBase.ELSE_DEF:
+      block = self._find_open_block(InterpreterBase.IF_DEF, indent)
+      if block is not None and block[3] is None:
+        block[3] = line_num
+        self.partners[block[0]] = line_num
+    elif keyword in JumpTable.BLOCK_ENDS:
+      block = self._find_open_block(JumpTable.BLOCK_ENDS[keyword], indent)
+      if block is None:
+        return   # stray terminator; the interpreter reports it if it is ever reached
+      del self.open_blocks[self.open_blocks.index(block):]
+      start_line, _, _, else_line = block
+      if else_line is None:
+        self.partners[start_line] = line_num
+      else:
+        self.partners[else_line] = line_num
+      if keyword == InterpreterBase.ENDWHILE_DEF:
+        self.partners[line_num] = start_line
+
+  def _find_open_block(self, keyword, indent):
+    for block in reversed(self.open_blocks):
+      if block[1] == keyword and block[2] == indent:
+        return block
+    return None
@@ -0,0 +1,106 @@
+import collections
+from intbase import InterpreterBase
+from tokenizer import Tokenizer, TokenKind
+
+# Memoizer remembers the results of calls to pure brewin functions, so a call with the same
+# arguments as an earlier one can set its result without running the function again. A function
+# is pure if its result depends only on its arguments and calling it does nothing else:
+#   - it's defined with func (a lambda may read captured variables) and returns an int, bool or
+#     string, and all of its parameters are int, bool or string values (no references, objects
+#     or functions)
+#   - it doesn't print or read input, uses no objects, and defines no lambdas or func variables
+#   - it calls only strtoint and other pure functions, by names that are never rebound (see
+#     TypeChecker.static_functions), so each of its calls always runs the same code
+# Results are keyed on the function and the types and values of its arguments, and the table
+# keeps at most max_size of them, dropping the least recently used first.
+class Memoizer:
+  VALUE_TYPES = {InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF, InterpreterBase.STRING_DEF}
+  IMPURE_CALLS = {InterpreterBase.PRINT_DEF, InterpreterBase.INPUT_DEF}
+  IMPURE_VAR_TYPES = {InterpreterBase.OBJECT_DEF, InterpreterBase.FUNC_DEF}
+  # names that refer to a function, object or the method's object
+  IMPURE_NAMES = {InterpreterBase.RESULT_DEF + 'f', InterpreterBase.RESULT_DEF + 'o', InterpreterBase.THIS_DEF}
+
+  def __init__(self, tokenized_program, func_manager, static_functions, max_size=1024):
+    self.max_size = max_size
+    self.table = collections.OrderedDict()   # (start ip, arg type, arg value, ...) -> result
+    self.hits = 0
+    self.misses = 0
+    # start ip -> name of each pure function
+    self.pure_functions = self._find_pure_functions(tokenized_program, func_manager, static_functions)
+
+  # true if calls to the function (a FuncInfo) can be memoized
+  def is_pure(self, func_info):
+    return func_info.start_ip in self.pure_functions and func_info.captures is None
+
+  # the remembered result for the key, or None
+  def lookup(self, key):
+    result = self.table.get(key)
+    if result is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.table.move_to_end(key)
+    return result
+
+  def store(self, key, result):
+    self.table[key] = result
+    self.table.move_to_end(key)
+    if len(self.table) > self.max_size:
+      self.table.popitem(last=False)
+
+  def get_stats(self):
+    calls = self.hits + self.misses
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'hit_rate': self.hits / calls if calls else 0.0,
+      'entries': len(self.table),
+      'max_size': self.max_size,
+      'pure_functions': sorted(self.pure_functions.values()),
+    }
+
+  # the candidates are the functions that are pure apart from the functions they call; then
+  # any that calls a function which isn't pure is dropped, until none are (recursion is fine)
+  def _find_pure_functions(self, tokenized_program, func_manager, static_functions):
+    callees = {}   # candidate name -> names of the functions it calls
+    for name in static_functions:
+      func_info = func_manager.get_function_info(name)
+      if func_info is None or func_info.return_type not in Memoizer.VALUE_TYPES:
+        continue
+      if any(typename not in Memoizer.VALUE_TYPES for _, typename in func_info.params):
+        continue
+      called = self._find_callees(tokenized_program, func_info.start_ip)
+      if called is not None:
+        callees[name] = called
+
+    changed = True
+    while changed:
+      changed = False
+      for name, called in list(callees.items()):
+        if any(callee not in callees for callee in called):
+          del callees[name]
+          changed = True
+    return {func_manager.get_function_info(name).start_ip: name for name in callees}
+
+  # the user functions called by the function whose body starts on the given line, or None if
+  # the body does anything impure itself
+  def _find_callees(self, tokenized_program, start_ip):
+    called = set()
+    for tokens in tokenized_program[start_ip:]:
+      if not tokens:
+        continue
+      keyword = tokens[0]
+      if keyword == InterpreterBase.ENDFUNC_DEF:
+        return called
+      if keyword == InterpreterBase.LAMBDA_DEF:
+        return None
+      if keyword == InterpreterBase.VAR_DEF and len(tokens) > 1 and tokens[1] in Memoizer.IMPURE_VAR_TYPES:
+        return None
+      if any(token in Memoizer.IMPURE_NAMES or Tokenizer.kind_of(token) == TokenKind.MEMBER for token in tokens[1:]):
+        return None
+      if keyword == InterpreterBase.FUNCCALL_DEF and len(tokens) > 1:
+        if tokens[1] in Memoizer.IMPURE_CALLS:
+          return None
+        if tokens[1] != InterpreterBase.STRTOINT_DEF:
+          called.add(tokens[1])
+    return None
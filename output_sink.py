@@ -0,0 +1,125 @@
+import collections
+import sys
+
+# Output sinks receive every line a brewin program prints. An interpreter is given one at
+# construction (the default is a ListSink, which keeps every line for get_output()); the others
+# let long-running programs print without holding all of their output in memory.
+
+# base class: a sink that keeps nothing and needs no flushing
+class OutputSink:
+  def write(self, line):
+    pass
+
+  # push any buffered output to its destination; called when a run ends
+  def flush(self):
+    pass
+
+  # forget any output from a previous run
+  def reset(self):
+    pass
+
+  # the lines kept in memory, or None if the sink doesn't keep them
+  def get_output(self):
+    return None
+
+# keeps every line in memory
+class ListSink(OutputSink):
+  def __init__(self):
+    self.lines = []
+
+  def write(self, line):
+    self.lines.append(line)
+
+  def reset(self):
+    self.lines = []
+
+  def get_output(self):
+    return self.lines
+
+# drops every line, only counting them
+class DiscardSink(OutputSink):
+  def __init__(self):
+    self.line_count = 0
+
+  def write(self, line):
+    self.line_count += 1
+
+  def reset(self):
+    self.line_count = 0
+
+# writes lines to a stream (stdout by default) in batches of flush_lines lines, rather than one
+# write per line; flush_lines=1 writes every line as it is printed
+class BufferedWriterSink(OutputSink):
+  def __init__(self, stream=None, flush_lines=1024):
+    self.stream = stream
+    self.flush_lines = flush_lines
+    self.buffer = []
+
+  def write(self, line):
+    self.buffer.append(str(line))
+    if len(self.buffer) >= self.flush_lines:
+      self.flush()
+
+  def flush(self):
+    if not self.buffer:
+      return
+    stream = self.stream if self.stream is not None else sys.stdout
+    stream.write('\n'.join(self.buffer) + '\n')
+    stream.flush()
+    self.buffer = []
+
+  def reset(self):
+    self.buffer = []
+
+# keeps only the last max_lines lines
+class RingSink(OutputSink):
+  def __init__(self, max_lines=1000):
+    self.lines = collections.deque(maxlen=max_lines)
+
+  def write(self, line):
+    self.lines.append(line)
+
+  def reset(self):
+    self.lines.clear()
+
+  def get_output(self):
+    return list(self.lines)
+
+# raised by a ComparatorSink created with stop_on_mismatch as soon as the output goes wrong
+class OutputMismatch(Exception):
+  pass
+
+# compares the output against the expected lines as it is printed, without keeping it. Once a
+# line doesn't match, the rest of the output is ignored (or, with stop_on_mismatch, the program
+# is stopped by raising OutputMismatch from the print).
+class ComparatorSink(OutputSink):
+  def __init__(self, expected, stop_on_mismatch=False):
+    self.expected = expected
+    self.stop_on_mismatch = stop_on_mismatch
+    self.reset()
+
+  def write(self, line):
+    if self.mismatch is not None:
+      return
+    if self.matched < len(self.expected) and line == self.expected[self.matched]:
+      self.matched += 1
+      return
+    self.mismatch = line
+    if self.stop_on_mismatch:
+      raise OutputMismatch(f'Output line {self.matched} was {line!r}, expected '
+                           f'{self.expected[self.matched] if self.matched < len(self.expected) else "no more output"!r}')
+
+  def reset(self):
+    self.matched = 0       # number of leading lines that matched
+    self.mismatch = None   # the first line that didn't
+
+  # true if the output so far is exactly the expected output
+  def matches(self):
+    return self.mismatch is None and self.matched == len(self.expected)
+
+  # the output up to and including the first mismatching line
+  def get_output(self):
+    output = self.expected[:self.matched]
+    if self.mismatch is not None:
+      output.append(self.mismatch)
+    return output
@@ -0,0 +1,184 @@
+import argparse
+import json
+import sys
+import threading
+
+# Profiler collects, while a brewin program runs, how many times each line executed and how long
+# it took in total, and how many times each function (or lambda) was called. Line times are self
+# times: a funccall line is charged for setting up the call, while the statements of the called
+# function are charged to their own lines. Results are aggregated per brewin function, using the
+# function table's start IPs, with lambdas reported under their synthetic names (lambda:<line>).
+class Profiler:
+  NO_FUNCTION = '<none>'   # lines outside of any function (never executed by a valid program)
+
+  def __init__(self, program, jump_table, func_manager):
+    self.program = program
+    self.hits = [0] * len(program)
+    self.times = [0.0] * len(program)
+    self.calls = {}   # function name -> number of calls
+    self.function_starts = {info.start_ip: name for name, info in func_manager.program_functions.items()}
+    self.line_functions = get_line_functions(len(program), jump_table, func_manager)
+
+  # charge elapsed seconds to one execution of the line
+  def record(self, line_num, elapsed):
+    self.hits[line_num] += 1
+    self.times[line_num] += elapsed
+
+  # count a call to the function whose first instruction is start_ip
+  def record_call(self, start_ip):
+    name = self.function_starts.get(start_ip, Profiler.NO_FUNCTION)
+    self.calls[name] = self.calls.get(name, 0) + 1
+
+  def get_line_stats(self):
+    total = sum(self.times)
+    lines = [{
+      'line': line_num,
+      'function': self.line_functions[line_num],
+      'hits': self.hits[line_num],
+      'time': self.times[line_num],
+      'percent': self._percent(self.times[line_num], total),
+      'source': self.program[line_num].strip(),
+    } for line_num in range(len(self.program)) if self.hits[line_num]]
+    return sorted(lines, key=lambda stats: (-stats['time'], stats['line']))
+
+  def get_function_stats(self):
+    functions = {}
+    for line_num, function in enumerate(self.line_functions):
+      if not self.hits[line_num]:
+        continue
+      stats = functions.setdefault(function, {'function': function, 'calls': self.calls.get(function, 0),
+                                              'statements': 0, 'time': 0.0})
+      stats['statements'] += self.hits[line_num]
+      stats['time'] += self.times[line_num]
+    total = sum(self.times)
+    for stats in functions.values():
+      stats['percent'] = self._percent(stats['time'], total)
+    return sorted(functions.values(), key=lambda stats: (-stats['time'], stats['function']))
+
+  # a human-readable report of the functions and the hottest lines, slowest first
+  def report(self, max_lines=20):
+    lines = [f'Total: {sum(self.hits)} statements in {sum(self.times):.6f}s', '',
+             f'{"self time":>12} {"%":>6} {"calls":>8} {"statements":>11}  function']
+    for stats in self.get_function_stats():
+      lines.append(f'{stats["time"]:>12.6f} {stats["percent"]:>6.2f} {stats["calls"]:>8} '
+                   f'{stats["statements"]:>11}  {stats["function"]}')
+    lines += ['', f'{"time":>12} {"%":>6} {"hits":>8} {"line":>6}  source']
+    for stats in self.get_line_stats()[:max_lines]:
+      lines.append(f'{stats["time"]:>12.6f} {stats["percent"]:>6.2f} {stats["hits"]:>8} '
+                   f'{stats["line"]:>6}  {stats["source"]}')
+    return '\n'.join(lines)
+
+  def to_json(self):
+    return {
+      'total_statements': sum(self.hits),
+      'total_time': sum(self.times),
+      'functions': self.get_function_stats(),
+      'lines': self.get_line_stats(),
+    }
+
+  def write_json(self, path):
+    with open(path, 'w') as handle:
+      json.dump(self.to_json(), handle, indent=2)
+
+  def _percent(self, time, total):
+    return 100 * time / total if total else 0.0
+
+# SamplingProfiler snapshots the running interpreter's brewin call stack from a background thread
+# every interval seconds, so its cost depends on the sampling rate rather than on the number of
+# statements executed. The stack is rebuilt from the interpreter's return stack (each return
+# address follows the call site of a caller) plus the current IP, and samples are counted per
+# distinct stack in the collapsed-stack format flamegraph tools read ("main;f;g 42"). Samples
+# are taken without stopping the interpreter, so one taken mid-call may be off by a frame.
+class SamplingProfiler:
+  def __init__(self, interpreter, interval=0.001):
+    self.interpreter = interpreter
+    self.interval = interval
+    self.line_functions = get_line_functions(len(interpreter.program), interpreter.jump_table, interpreter.func_manager)
+    self.stacks = {}   # collapsed stack -> number of samples
+    self._stopped = threading.Event()
+    self._thread = None
+
+  def start(self):
+    self._stopped.clear()
+    self._thread = threading.Thread(target=self._sample_until_stopped, daemon=True)
+    self._thread.start()
+
+  def stop(self):
+    self._stopped.set()
+    if self._thread is not None:
+      self._thread.join()
+      self._thread = None
+
+  # take one sample of the interpreter's current call stack
+  def sample(self):
+    ip = self.interpreter.ip
+    return_stack = list(self.interpreter.return_stack)
+    frames = [self.line_functions[return_ip - 1] for return_ip in return_stack]
+    frames.append(self.line_functions[ip])
+    stack = ';'.join(frames)
+    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+  # the samples as collapsed-stack lines, most frequent first
+  def get_collapsed_stacks(self):
+    return [f'{stack} {count}' for stack, count in sorted(self.stacks.items(), key=lambda item: (-item[1], item[0]))]
+
+  def write_collapsed_stacks(self, path):
+    with open(path, 'w') as handle:
+      for line in self.get_collapsed_stacks():
+        handle.write(line + '\n')
+
+  def _sample_until_stopped(self):
+    while not self._stopped.wait(self.interval):
+      self.sample()
+
+# the name of the function (or lambda) each line of the program belongs to. Each function owns the
+# lines from its first instruction to its endfunc/endlambda; the lambda statement itself runs in the
+# enclosing function. Nested lambdas start later, so assigning ranges in start order lets them
+# overwrite their part of the enclosing function.
+def get_line_functions(num_lines, jump_table, func_manager):
+  line_functions = [Profiler.NO_FUNCTION] * num_lines
+  for name, func_info in sorted(func_manager.program_functions.items(), key=lambda item: item[1].start_ip):
+    end_line = jump_table.get_partner(func_info.start_ip - 1)
+    if end_line is None:
+      continue
+    for line_num in range(func_info.start_ip, end_line + 1):
+      line_functions[line_num] = name
+  return line_functions
+
+# profile a brewin v3 program from the command line:
+#   python3 profiler.py program.src [--json profile.json] [--engine vm]
+# or, with --sample, sample its call stack instead and write collapsed stacks for a flamegraph:
+#   python3 profiler.py program.src --sample 0.001 --collapsed stacks.txt
+def main():
+  from interpreterv3 import Interpreter
+
+  parser = argparse.ArgumentParser()
+  parser.add_argument('program', help='brewin v3 source file to profile')
+  parser.add_argument('--json', help='also write the profile to this file as JSON')
+  parser.add_argument('--engine', default=Interpreter.LINE_ENGINE, choices=[Interpreter.LINE_ENGINE, Interpreter.VM_ENGINE])
+  parser.add_argument('--lines', type=int, default=20, help='number of lines to include in the report')
+  parser.add_argument('--sample', type=float, metavar='INTERVAL', help='sample the call stack every INTERVAL seconds')
+  parser.add_argument('--collapsed', help='write sampled stacks to this file (default: stderr)')
+  args = parser.parse_args()
+
+  with open(args.program) as handle:
+    program = handle.readlines()
+  if args.sample is not None:
+    interpreter = Interpreter(engine=args.engine, sample_interval=args.sample)
+  else:
+    interpreter = Interpreter(engine=args.engine, profile=True)
+  try:
+    interpreter.run(program)
+  finally:
+    if interpreter.sampler is not None:
+      if args.collapsed:
+        interpreter.sampler.write_collapsed_stacks(args.collapsed)
+      else:
+        print('\n'.join(interpreter.sampler.get_collapsed_stacks()), file=sys.stderr)
+    if interpreter.profiler is not None:
+      print(interpreter.profiler.report(args.lines), file=sys.stderr)
+      if args.json:
+        interpreter.profiler.write_json(args.json)
+
+if __name__ == '__main__':
+  main()
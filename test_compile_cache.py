@@ -0,0 +1,27 @@
+import tempfile
+import unittest
+
+from compile_cache import CompileCache
+from intbase import ErrorType
+from interpreterv3 import Interpreter
+
+class CompileCacheTest(unittest.TestCase):
+  # the same text split into lines differently must not share a cache entry
+  def test_line_splits_dont_collide(self):
+    first = ['func main void', '  var int x', '  funccall print x', 'endfunc']
+    second = ['func main void', '  var int x  funccall print x', 'endfunc']
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = CompileCache(cache_dir)
+      self.assertNotEqual(cache._path(first), cache._path(second))
+
+      interpreter = Interpreter(False, None, False, cache_dir=cache_dir)
+      interpreter.run(first)
+      self.assertEqual(interpreter.get_output(), ['0'])
+
+      interpreter = Interpreter(False, None, False, cache_dir=cache_dir)
+      with self.assertRaises(Exception):
+        interpreter.run(second)
+      self.assertEqual(interpreter.get_error_type_and_line(), (ErrorType.NAME_ERROR, 1))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,98 @@
+import os
+import unittest
+
+import tester
+from intbase import ErrorType
+from interpreterv3 import Interpreter
+
+# every run is capped, so a program that never ends (e.g., testsv3/test122) stops with a LIMIT_ERROR
+MAX_INSTRUCTIONS = 200000
+
+# the options each test case is also run with; each must give the same result as the defaults
+OPTIONS = [
+  {'engine': Interpreter.VM_ENGINE},
+  {'memoize': True},
+  {'eliminate_tail_calls': False},
+  {'engine': Interpreter.VM_ENGINE, 'memoize': True, 'eliminate_tail_calls': False},
+]
+
+# the output of the program, and the error it stopped with (or None)
+def run_program(test_case, max_instructions=MAX_INSTRUCTIONS, max_call_depth=None, **options):
+  with open(test_case['srcfile']) as handle:
+    program = handle.readlines()
+  inputfile = test_case['inputfile']
+  input = list(tester.read_lines(inputfile)) if os.path.exists(inputfile) else None
+  interpreter = Interpreter(False, input, False, **options)
+  try:
+    interpreter.run(program, max_instructions=max_instructions, max_call_depth=max_call_depth)
+  except Exception:
+    return interpreter.get_output(), interpreter.get_error_type_and_line()
+  return interpreter.get_output(), None
+
+class InterpreterOptionsTest(unittest.TestCase):
+  # the v2 and v3 test programs behave the same under every engine and optimization
+  def test_options_match_defaults(self):
+    for test_case in tester.generate_test_suite_v2() + tester.generate_test_suite_v3():
+      expected = run_program(test_case)
+      for options in OPTIONS:
+        with self.subTest(test=test_case['srcfile'], **options):
+          self.assertEqual(run_program(test_case, **options), expected)
+
+class LimitsAndCallsTest(unittest.TestCase):
+  LOOP = ['func main void', '  while True', '  endwhile', 'endfunc']
+
+  # count n down to 0 with a call in tail position, n calls deep
+  COUNTDOWN = ['func count n:int int',
+               '  if == n 0',
+               '    return 0',
+               '  endif',
+               '  var int m',
+               '  assign m - n 1',
+               '  funccall count m',
+               '  return resulti',
+               'endfunc',
+               'func main void',
+               '  var int n',
+               '  assign n 500',
+               '  funccall count n',
+               '  funccall print resulti',
+               '  funccall count n',
+               '  funccall print resulti',
+               'endfunc']
+
+  def _run(self, program, max_instructions=None, max_call_depth=None, **options):
+    interpreter = Interpreter(False, None, False, **options)
+    try:
+      interpreter.run(program, max_instructions=max_instructions, max_call_depth=max_call_depth)
+    except Exception:
+      return interpreter, interpreter.get_error_type_and_line()
+    return interpreter, None
+
+  def test_instruction_limit(self):
+    for engine in (Interpreter.LINE_ENGINE, Interpreter.VM_ENGINE):
+      with self.subTest(engine=engine):
+        _, error = self._run(LimitsAndCallsTest.LOOP, max_instructions=1000, engine=engine)
+        self.assertEqual(error[0], ErrorType.LIMIT_ERROR)
+
+  # tail calls reuse the caller's frame, so the countdown fits in a call depth of 2 (main and
+  # count); without tail calls it needs one frame per call
+  def test_tail_calls(self):
+    interpreter, error = self._run(LimitsAndCallsTest.COUNTDOWN, max_call_depth=2)
+    self.assertIsNone(error)
+    self.assertEqual(interpreter.get_output(), ['0', '0'])
+
+    _, error = self._run(LimitsAndCallsTest.COUNTDOWN, max_call_depth=2, eliminate_tail_calls=False)
+    self.assertEqual(error[0], ErrorType.LIMIT_ERROR)
+
+  # the second countdown is answered from the memo table by its first call
+  def test_memoize(self):
+    for eliminate_tail_calls in (True, False):
+      with self.subTest(eliminate_tail_calls=eliminate_tail_calls):
+        interpreter, error = self._run(LimitsAndCallsTest.COUNTDOWN, memoize=True,
+                                       eliminate_tail_calls=eliminate_tail_calls)
+        self.assertIsNone(error)
+        self.assertEqual(interpreter.get_output(), ['0', '0'])
+        self.assertGreaterEqual(interpreter.get_memo_stats()['hits'], 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,10 +1,12 @@
+import argparse
 import importlib
+import os
 from os import environ
-import sys
 import traceback
 from operator import itemgetter
 
 from harness import AbstractTestScaffold, run_all_tests, get_score, write_gradescope_output, exit_after
+from output_sink import ComparatorSink, OutputMismatch
 
 # TODO: documentation :)
 
@@ -20,11 +22,7 @@ class TestScaffold(AbstractTestScaffold):
     with open(solfile) as handle:
       expected = list(map(lambda x:x.rstrip('\n'), handle.readlines()))
 
-    try:
-      with open(inputfile) as handle:
-        input = list(map(lambda x:x.rstrip('\n'), handle.readlines()))
-    except:
-      input = None
+    input = read_lines(inputfile) if os.path.exists(inputfile) else None
 
     with open(srcfile) as handle:
       program = handle.readlines()
@@ -35,10 +33,13 @@ class TestScaffold(AbstractTestScaffold):
       'program': program,
     }
 
+  # tests that should print the expected output compare it line by line as it is printed, and
+  # stop the program at the first wrong (or extra) line instead of letting it run to the end
   @exit_after(5)
-  def run_validation(self, _, environment):
-    input, program = itemgetter('input', 'program')(environment)
-    self.interpreter = self.interpreter_lib.Interpreter(False, input, False)
+  def run_validation(self, test_case, environment):
+    input, program, expected = itemgetter('input', 'program', 'expected')(environment)
+    output = None if test_case['expect_failure'] else ComparatorSink(expected, stop_on_mismatch=True)
+    self.interpreter = self.interpreter_lib.Interpreter(False, input, False, output=output)
     self.interpreter.validate_program(program)
 
   @exit_after(5)
@@ -47,6 +48,8 @@ class TestScaffold(AbstractTestScaffold):
     expected, program = itemgetter('expected', 'program')(environment)
     try:
       self.interpreter.run(program)
+    except OutputMismatch:
+      pass   # reported below, along with the output up to the mismatch
     except Exception as e:
       if expect_failure:
         error_type, line = self.interpreter.get_error_type_and_line()
@@ -70,7 +73,7 @@ class TestScaffold(AbstractTestScaffold):
       print(self.interpreter.get_output())
       return 0
 
-    passed = self.interpreter.get_output() == expected
+    passed = self.interpreter.output_sink.matches()
     if not passed:
       print('\nExpected output:')
       print(expected)
@@ -79,6 +82,12 @@ class TestScaffold(AbstractTestScaffold):
 
     return int(passed)
 
+# the lines of a file, read lazily as the program asks for input
+def read_lines(filename):
+  with open(filename) as handle:
+    for line in handle:
+      yield line.rstrip('\n')
+
 # Utils to generate test structure; defaults to showing test case immediately
 def generate_test_case_structure(cases, dir, category='', expect_failure=False, visible= lambda _: True):
   fprefix = f'{dir}test'
@@ -128,8 +137,8 @@ def generate_test_suite_v2():
 
 def generate_test_suite_v3():
   version = "3"
-  successes = [20, 22, 37, 112, 113, 114, 122, 127, 140, 156, 201, 202, 203, 204, 205]
-  fails = [26, 27, 29, 30, 105]
+  successes = [20, 22, 37, 112, 113, 114, 122, 127, 140, 156, 201, 202, 203, 204, 205, 206]
+  fails = [26, 27, 29, 30, 105, 106, 107, 108]
   return generate_test_case_structure(
     successes,
     f'testsv{version}/',
@@ -144,9 +153,11 @@ def generate_test_suite_v3():
 
 # main entrypoint - just calls functions :)
 def main():
-  if not sys.argv:
-    print('Error: Missing version number argument')
-  version = sys.argv[1]
+  parser = argparse.ArgumentParser()
+  parser.add_argument('version', help='interpreter version to test (1, 2 or 3)')
+  parser.add_argument('-j', '--jobs', type=int, default=1, help='number of tests to run in parallel')
+  args = parser.parse_args()
+  version = args.version
   module_name = f'interpreterv{version}'
   interpreter = importlib.import_module(module_name)
 
@@ -161,7 +172,7 @@ def main():
       tests = generate_test_suite_v3()
 
 
-  results = run_all_tests(scaffold, tests)
+  results = run_all_tests(scaffold, tests, args.jobs)
   total_score = get_score(results) / len(results) * 100.0
   print(f"Total Score: {total_score:9.2f}%")
 
@@ -1,45 +1,154 @@
-from intbase import InterpreterBase, ErrorType
+import re
+import sys
+from enum import Enum
+from intbase import InterpreterBase
+
+class TokenKind(Enum):
+  KEYWORD = 1
+  IDENTIFIER = 2
+  OPERATOR = 3
+  INT = 4       # int literal, e.g. 42 or -5
+  STRING = 5    # string literal, e.g. "foo"
+  BOOL = 6      # True or False
+  MEMBER = 7    # dotted object member, e.g. obj.field
+  FORMAL = 8    # parameter declaration, e.g. x:int
+
+# Tokens are strings, so everything that worked with the text of a token keeps working. The
+# tokens that would otherwise be re-parsed every time they are used (literals, dotted members
+# and parameter declarations) are typed records that also carry their kind and pre-parsed
+# parts. Keywords, names and operators stay plain (interned) strings: they are looked up in
+# dictionaries and compared against keywords all the time, which is slower for a str subclass,
+# and their kind follows from their text (see Tokenizer.kind_of).
+# raised for a line that can't be tokenized; the interpreters report it as a SYNTAX_ERROR
+class TokenizerError(Exception):
+  def __init__(self, line_num, description):
+    super().__init__(description)
+    self.line_num = line_num
+    self.description = description
+
+class Token(str):
+  __slots__ = ()   # the records carry only their parsed parts, no instance dict
+  kind = None
+
+class IntLiteral(Token):
+  __slots__ = ('value',)
+  kind = TokenKind.INT
+  def __init__(self, text):
+    self.value = int(text)
+
+class StringLiteral(Token):
+  __slots__ = ('value',)
+  kind = TokenKind.STRING
+  def __init__(self, text):
+    self.value = text.strip('"')
+
+class BoolLiteral(Token):
+  __slots__ = ('value',)
+  kind = TokenKind.BOOL
+  def __init__(self, text):
+    self.value = text == InterpreterBase.TRUE_DEF
+
+class Member(Token):
+  __slots__ = ('object_name', 'member_name')
+  kind = TokenKind.MEMBER
+  def __init__(self, text):
+    object_name, _, member_name = text.partition('.')
+    self.object_name = sys.intern(object_name)
+    self.member_name = sys.intern(member_name)
+
+class Formal(Token):
+  __slots__ = ('name', 'type_name')
+  kind = TokenKind.FORMAL
+  def __init__(self, text):
+    name, _, type_name = text.partition(':')
+    self.name = sys.intern(name)
+    self.type_name = sys.intern(type_name)
 
 # Tokenzies a program, e.g., "assign var + 5 10" --> ["assign","var","+","5","10"] for each line of the input program
 # Input: A list of strings, e.g.: ["func main", " assign x 10", " funccall print x","endfunc"]
 # Output: A list of lists of tokens, e.g.: [["func","main"],["assign","x","10"],["funccall","print","x"],["endfunc"]]
+# Lines without strings are split by str methods alone; lines with strings are scanned once by a
+# regular expression that picks out quoted strings, words, and the comment character that ends
+# the line's code. Tokens are immutable, so each distinct piece of text is made into a token once
+# per program and shared by every line that uses it.
 class Tokenizer:
+  # a whole string literal, a word (stopping at a quote or comment), or a lone quote/comment char
+  SCANNER = re.compile(r'"[^"]*"|[^\s"#]+|[#"]')
+  KEYWORDS = {
+    InterpreterBase.FUNC_DEF, InterpreterBase.ENDFUNC_DEF, InterpreterBase.WHILE_DEF,
+    InterpreterBase.ENDWHILE_DEF, InterpreterBase.IF_DEF, InterpreterBase.ELSE_DEF,
+    InterpreterBase.ENDIF_DEF, InterpreterBase.ASSIGN_DEF, InterpreterBase.FUNCCALL_DEF,
+    InterpreterBase.RETURN_DEF, InterpreterBase.VAR_DEF, InterpreterBase.LAMBDA_DEF,
+    InterpreterBase.ENDLAMBDA_DEF, InterpreterBase.INT_DEF, InterpreterBase.BOOL_DEF,
+    InterpreterBase.STRING_DEF, InterpreterBase.VOID_DEF, InterpreterBase.OBJECT_DEF,
+  }
+  OPERATORS = {'+', '-', '*', '/', '%', '==', '!=', '<', '<=', '>', '>=', '&', '|', '!'}
+  BOOLS = {InterpreterBase.TRUE_DEF, InterpreterBase.FALSE_DEF}
+
   # Performs tokenization and returns the tokenized program
   def tokenize_program(program):
     tokenized_program = []
+    known_tokens = {}
     for line_num, line in enumerate(program):
-      tokens = Tokenizer._tokenize(line_num, line.rstrip())
-      tokenized_program.append(tokens)
+      tokenized_program.append(Tokenizer.tokenize_line(line_num, line, known_tokens))
     return tokenized_program
 
-  def _remove_comment(s):
-   in_quote = False
-   for i in range(0,len(s)):
-     if s[i] == '"':
-      in_quote = not in_quote
-     elif s[i] == InterpreterBase.COMMENT_DEF and not in_quote:
-      return s[:i]
-   return s
-
-  def _tokenize(line_num, s):
-    s = Tokenizer._remove_comment(s)
-
-    tokens = []
-    search_from = 0
-    while True:
-      start_quote = end_quote = None
-      try:
-        start_quote = s.index('"', search_from)
-        end_quote = s.index('"', start_quote+1)
-      except:
-        if start_quote and not end_quote:
-          super().error(ErrorType.SYNTAX_ERROR,f"Mismatched quotes",line_num) #no
-      if start_quote is None:
+  # Tokenizes a single line of the program; known_tokens maps text to the tokens already made
+  # for it, and is shared between the lines of a program
+  def tokenize_line(line_num, line, known_tokens=None):
+    if known_tokens is None:
+      known_tokens = {}
+    if '"' in line:
+      words = Tokenizer._scan(line_num, line)
+    else:
+      words = line.split(InterpreterBase.COMMENT_DEF, 1)[0].split()
+    return [known_tokens.get(word) or Tokenizer._make_known_token(known_tokens, word) for word in words]
+
+  # the words of a line that contains a quote
+  def _scan(line_num, line):
+    words = []
+    for match in Tokenizer.SCANNER.finditer(line):
+      text = match.group()
+      if text == InterpreterBase.COMMENT_DEF:
         break
-      else:
-        tokens += s[search_from:start_quote].split()
-        tokens.append(s[start_quote:end_quote+1])
-        search_from = end_quote + 1
-    # no more quotes found, tokenize remaining string
-    tokens += s[search_from:].split()
-    return tokens
+      if text == '"':   # a string that isn't terminated on this line
+        raise TokenizerError(line_num, 'Mismatched quotes')
+      words.append(text)
+    return words
+
+  def _make_known_token(known_tokens, text):
+    token = known_tokens[text] = Tokenizer.make_token(text)
+    return token
+
+  # the token for a piece of program text: a typed record, or the interned text itself
+  def make_token(text):
+    first = text[0]
+    if first == '"':
+      return StringLiteral(text)
+    if text.isdigit() or (first == '-' and text[1:].isdigit()):
+      return IntLiteral(text)
+    if text in Tokenizer.BOOLS:
+      return BoolLiteral(text)
+    if '.' in text:
+      return Member(text)
+    if ':' in text:
+      return Formal(text)
+    return sys.intern(text)
+
+  def kind_of(token):
+    if isinstance(token, Token):
+      return token.kind
+    if token in Tokenizer.KEYWORDS:
+      return TokenKind.KEYWORD
+    if token in Tokenizer.OPERATORS:
+      return TokenKind.OPERATOR
+    return TokenKind.IDENTIFIER
+
+  # the tokens as plain strings (e.g., for caching); Tokenizer.restore() rebuilds the records
+  def export(tokenized_program):
+    return [[str(token) for token in tokens] for tokens in tokenized_program]
+
+  def restore(exported):
+    known_tokens = {}
+    return [[known_tokens.get(text) or Tokenizer._make_known_token(known_tokens, text) for text in tokens]
+            for tokens in exported]
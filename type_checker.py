@@ -0,0 +1,280 @@
+from intbase import InterpreterBase
+from tokenizer import Tokenizer, TokenKind
+
+# TypeChecker works out, ahead of time, which statements of a brewin program can never raise a
+# type error, so the interpreter can run them without its per-execution type checks, and which
+# statements are certain to raise one when they run.
+#
+# It walks each function (and lambda) in program order, tracking the declared type of every
+# variable in scope the same way the EnvironmentManager scopes them at runtime: params (and a
+# lambda's captured variables) in the function's top block, var definitions in the innermost
+# block, one nested block per if/else/while body. Only int, bool and string are tracked; any
+# expression involving another type, an object member, or a name that might be bound to a
+# function at runtime is left unproven and checked dynamically as before.
+class TypeChecker:
+  INT = InterpreterBase.INT_DEF
+  BOOL = InterpreterBase.BOOL_DEF
+  STRING = InterpreterBase.STRING_DEF
+
+  # operator -> {operand type -> result type}
+  BINARY_OPS = {
+    '+': {INT: INT, STRING: STRING},
+    '-': {INT: INT},
+    '*': {INT: INT},
+    '/': {INT: INT},
+    '%': {INT: INT},
+    '==': {INT: BOOL, STRING: BOOL, BOOL: BOOL},
+    '!=': {INT: BOOL, STRING: BOOL, BOOL: BOOL},
+    '<': {INT: BOOL, STRING: BOOL},
+    '<=': {INT: BOOL, STRING: BOOL},
+    '>': {INT: BOOL, STRING: BOOL},
+    '>=': {INT: BOOL, STRING: BOOL},
+    '&': {BOOL: BOOL},
+    '|': {BOOL: BOOL},
+  }
+
+  # the type of each param type once it's bound (reference params hold the referenced value)
+  PARAM_TYPES = {
+    InterpreterBase.INT_DEF: INT,
+    InterpreterBase.BOOL_DEF: BOOL,
+    InterpreterBase.STRING_DEF: STRING,
+    InterpreterBase.REFINT_DEF: INT,
+    InterpreterBase.REFBOOL_DEF: BOOL,
+    InterpreterBase.REFSTRING_DEF: STRING,
+  }
+
+  VAR_TYPES = {INT, BOOL, STRING}
+
+  LITERAL_TYPES = {TokenKind.INT: INT, TokenKind.STRING: STRING, TokenKind.BOOL: BOOL}
+
+  RESULT_TYPES = {
+    InterpreterBase.RESULT_DEF + 'i': INT,
+    InterpreterBase.RESULT_DEF + 'b': BOOL,
+    InterpreterBase.RESULT_DEF + 's': STRING,
+  }
+
+  def __init__(self, tokenized_program, func_manager):
+    self.func_manager = func_manager
+    self.proven = set()      # line numbers of statements that can't raise a type error
+    self.line_types = {}     # proven line number -> {operand: type} for the names and literals it uses
+    self.errors = []         # (line number, description) of statements that always fail, in order
+    self._find_dynamic_names(tokenized_program)
+    self._check_program(tokenized_program)
+
+  # returns true if the statement on this line needs no runtime type checks
+  def is_proven(self, line_num):
+    return line_num in self.proven
+
+  # the static types of the names and literals used by a proven line
+  def get_line_types(self, line_num):
+    return self.line_types[line_num]
+
+  # the checker's results as plain python data (e.g., for caching); TypeChecker.restore()
+  # rebuilds an equivalent checker from them and the program's tokens
+  def export(self):
+    line_types = {line_num: {str(token): type_name for token, type_name in types.items()}
+                  for line_num, types in self.line_types.items()}
+    return (self.proven, line_types, self.errors)
+
+  def restore(exported, func_manager, tokenized_program):
+    proven, line_types, errors = exported
+    type_checker = TypeChecker([], func_manager)
+    type_checker._find_dynamic_names(tokenized_program)
+    type_checker.proven = set(proven)
+    type_checker.line_types = dict(line_types)
+    type_checker.errors = [tuple(error) for error in errors]
+    return type_checker
+
+  # names whose type can't be known statically: anything that may be bound to a function at
+  # runtime (the interpreter looks those up in the FunctionManager before the environment), and
+  # the result variables if the program defines its own variables or params with those names.
+  # Functions whose name is never rebound are the only ones whose calls can be checked statically.
+  def _find_dynamic_names(self, tokenized_program):
+    function_names = set()
+    rebindable = {InterpreterBase.RESULT_DEF + 'f', InterpreterBase.THIS_DEF}
+    result_names_redefined = False
+    for line in tokenized_program:
+      if not line:
+        continue
+      if line[0] == InterpreterBase.FUNC_DEF and len(line) > 1:
+        function_names.add(line[1])
+      if line[0] in (InterpreterBase.FUNC_DEF, InterpreterBase.LAMBDA_DEF):
+        formals = line[2:-1] if line[0] == InterpreterBase.FUNC_DEF else line[1:-1]
+        for name, typename in self._split_formals(formals):
+          if typename not in TypeChecker.PARAM_TYPES:
+            rebindable.add(name)
+          if name in TypeChecker.RESULT_TYPES:
+            result_names_redefined = True
+      if line[0] == InterpreterBase.VAR_DEF and len(line) > 1:
+        if line[1] not in TypeChecker.VAR_TYPES:
+          rebindable.update(line[2:])
+        if any(name in TypeChecker.RESULT_TYPES for name in line[2:]):
+          result_names_redefined = True
+      if line[0] == InterpreterBase.ASSIGN_DEF and len(line) > 1 and '.' in line[1]:
+        rebindable.add(line[1].split('.')[-1])   # members may be assigned functions
+    if result_names_redefined:
+      rebindable.update(TypeChecker.RESULT_TYPES)
+    self.dynamic_names = function_names | rebindable
+    self.static_functions = function_names - rebindable
+
+  def _check_program(self, tokenized_program):
+    frames = []   # one list of blocks per enclosing function/lambda; each block maps name -> type
+    for line_num, line in enumerate(tokenized_program):
+      if not line:
+        continue
+      keyword = line[0]
+      if keyword == InterpreterBase.FUNC_DEF:
+        frames = [[self._param_types(line[2:-1])]]   # functions don't nest
+        continue
+      if not frames:
+        continue
+      blocks = frames[-1]
+      args = line[1:]
+      if keyword == InterpreterBase.LAMBDA_DEF:
+        captured = {}
+        for name in self.func_manager.get_function_info(self.func_manager.create_lambda_name(line_num)).free_vars:
+          captured[name] = self._lookup(blocks, name)
+        captured.update(self._param_types(args[:-1]))
+        frames.append([captured])
+      elif keyword in (InterpreterBase.ENDLAMBDA_DEF, InterpreterBase.ENDFUNC_DEF):
+        frames.pop()
+      elif keyword == InterpreterBase.VAR_DEF:
+        if args:
+          for name in args[1:]:
+            blocks[-1][name] = args[0] if args[0] in TypeChecker.VAR_TYPES else None
+      elif keyword == InterpreterBase.ASSIGN_DEF:
+        self._check_assign(line_num, blocks, args)
+      elif keyword in (InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF):
+        self._check_condition(line_num, blocks, keyword, args)
+        blocks.append({})
+      elif keyword == InterpreterBase.ELSE_DEF:
+        if len(blocks) > 1:
+          blocks.pop()
+        blocks.append({})
+      elif keyword in (InterpreterBase.ENDIF_DEF, InterpreterBase.ENDWHILE_DEF):
+        if len(blocks) > 1:
+          blocks.pop()
+      elif keyword == InterpreterBase.RETURN_DEF:
+        self._check_return(line_num, blocks, args)
+      elif keyword == InterpreterBase.FUNCCALL_DEF:
+        self._check_call(line_num, blocks, args)
+
+  def _split_formals(self, formals):
+    return [formal.partition(':')[::2] for formal in formals]
+
+  def _param_types(self, formals):
+    return {name: TypeChecker.PARAM_TYPES.get(typename) for name, typename in self._split_formals(formals)}
+
+  def _lookup(self, blocks, name):
+    if name in self.dynamic_names:
+      return None
+    if name in TypeChecker.RESULT_TYPES:
+      return TypeChecker.RESULT_TYPES[name]
+    for block in reversed(blocks):
+      if name in block:
+        return block[name]
+    return None
+
+  def _prove(self, line_num, blocks, tokens):
+    self.proven.add(line_num)
+    self.line_types[line_num] = {token: self._operand_type(blocks, token) for token in tokens
+                                 if token not in TypeChecker.BINARY_OPS and token != '!'}
+
+  def _check_assign(self, line_num, blocks, args):
+    if len(args) < 2 or '.' in args[0]:
+      return
+    target_type = self._lookup(blocks, args[0])
+    value_type = self._expression_type(line_num, blocks, args[1:])
+    if target_type is None or value_type is None:
+      return
+    if target_type != value_type:
+      self.errors.append((line_num, f"Trying to assign a variable of {target_type} to a value of {value_type}"))
+      return
+    self._prove(line_num, blocks, args[1:])
+
+  def _check_condition(self, line_num, blocks, keyword, args):
+    value_type = self._expression_type(line_num, blocks, args)
+    if value_type is None:
+      return
+    if value_type != TypeChecker.BOOL:
+      self.errors.append((line_num, f"Non-boolean {keyword} expression"))
+      return
+    self._prove(line_num, blocks, args)
+
+  def _check_return(self, line_num, blocks, args):
+    return_type = self.func_manager.get_return_type_for_enclosing_lambda_function(line_num)
+    if return_type is None:
+      return_type = self.func_manager.get_return_type_for_enclosing_function(line_num)
+    if not args:
+      return
+    if return_type == InterpreterBase.VOID_DEF:
+      self.errors.append((line_num, "Returning value from void function"))
+      return
+    if return_type not in TypeChecker.PARAM_TYPES:
+      return
+    value_type = self._expression_type(line_num, blocks, args)
+    if value_type is None:
+      return
+    if value_type != return_type:
+      self.errors.append((line_num, "Non-matching return type"))
+      return
+    self._prove(line_num, blocks, args)
+
+  # a call to a function defined with func whose arguments all match its parameter types
+  def _check_call(self, line_num, blocks, args):
+    if not args or args[0] not in self.static_functions:
+      return
+    func_info = self.func_manager.get_function_info(args[0])
+    if len(func_info.params) != len(args) - 1:
+      return
+    for (formal_name, formal_typename), actual in zip(func_info.params, args[1:]):
+      formal_type = TypeChecker.PARAM_TYPES.get(formal_typename)
+      actual_type = self._operand_type(blocks, actual)
+      if formal_type is None or actual_type is None:
+        return
+      if formal_type != actual_type:
+        self.errors.append((line_num, f"Mismatched parameter type for {formal_name} in call to {args[0]}"))
+        return
+    self._prove(line_num, blocks, args[1:])
+
+  # the static type of a prefix expression, or None if it can't be determined; expressions
+  # that are certain to fail are recorded as errors
+  def _expression_type(self, line_num, blocks, tokens):
+    stack = []
+    for token in reversed(tokens):
+      if token in TypeChecker.BINARY_OPS:
+        if len(stack) < 2:
+          return None
+        t1 = stack.pop()
+        t2 = stack.pop()
+        if t1 is None or t2 is None:
+          stack.append(None)
+        elif t1 != t2:
+          self.errors.append((line_num, f"Mismatching types {t1} and {t2}"))
+          return None
+        elif t1 not in TypeChecker.BINARY_OPS[token]:
+          self.errors.append((line_num, f"Operator {token} is not compatible with {t1}"))
+          return None
+        else:
+          stack.append(TypeChecker.BINARY_OPS[token][t1])
+      elif token == '!':
+        if not stack:
+          return None
+        t1 = stack.pop()
+        if t1 is not None and t1 != TypeChecker.BOOL:
+          self.errors.append((line_num, f"Expecting boolean for ! {t1}"))
+          return None
+        stack.append(t1)
+      else:
+        stack.append(self._operand_type(blocks, token))
+    if len(stack) != 1:
+      return None
+    return stack[0]
+
+  def _operand_type(self, blocks, token):
+    kind = Tokenizer.kind_of(token)
+    if kind in TypeChecker.LITERAL_TYPES:
+      return TypeChecker.LITERAL_TYPES[kind]
+    if kind == TokenKind.MEMBER:
+      return None
+    return self._lookup(blocks, token)